@@ -0,0 +1,103 @@
+import asyncio
+import logging
+import os
+import time
+
+import metrics
+from analysis_cache import analysis_cache
+
+
+logger = logging.getLogger("essay")
+
+CPU_API_BASE = os.getenv("CPU_API_BASE", "http://13.200.201.10:8000")
+
+# Seconds allowed per scoring call before it is dropped from the result.
+DEFAULT_TIMEOUTS = {
+    "emotion": 20.0,
+    "stt": 30.0,
+    "fluency": 15.0,
+    "pronunciation": 20.0,
+}
+
+
+async def _post_audio(client, endpoint, audio):
+    # Every upload shares the AudioBuffer's single WAV encoding.
+    return await client.post_file(f"{CPU_API_BASE}{endpoint}", audio.wav, filename=audio.name)
+
+
+async def detect_emotion(client, audio):
+    async def compute():
+        data = await _post_audio(client, "/detect-emotion", audio)
+        return data.get("emotion")
+    return await analysis_cache.get_or_compute("emotion", audio, compute)
+
+
+async def pronunciation_score(client, audio):
+    async def compute():
+        data = await _post_audio(client, "/pronunciation-score", audio)
+        return data.get("pronunciation")
+    return await analysis_cache.get_or_compute("pronunciation", audio, compute)
+
+
+async def fluency_score(client, text):
+    async def compute():
+        data = await client.post_json(f"{CPU_API_BASE}/fluency-score", {"text": text})
+        return data.get("fluency")
+    return await analysis_cache.get_or_compute("fluency", text, compute)
+
+
+async def _stage(name, coro, timeout, timings, errors):
+    start = time.perf_counter()
+    try:
+        return await asyncio.wait_for(coro, timeout=timeout)
+    except asyncio.TimeoutError:
+        logger.error(f"[Analysis] '{name}' timed out after {timeout}s")
+        errors[name] = "timeout"
+    except Exception as e:
+        logger.error(f"[Analysis] '{name}' failed: {e}")
+        errors[name] = str(e) or type(e).__name__
+    finally:
+        elapsed = time.perf_counter() - start
+        timings[name] = round(elapsed, 3)
+        metrics.tracker(f"analysis.{name}").observe(elapsed)
+    return None
+
+
+async def analyse_utterance(client, audio, transcribe, timeouts=None) -> dict:
+    """Score one utterance with every independent call in flight at once.
+
+    Emotion and pronunciation only need the audio, so they run alongside
+    speech-to-text; fluency starts as soon as the transcript is ready. A call
+    that fails or times out leaves its field as None and is listed in
+    `errors`; the other results are still returned. `client` is the shared
+    HttpClient, `audio` an AudioBuffer; `transcribe` is a zero-argument
+    coroutine function returning the transcript.
+    """
+    timeouts = {**DEFAULT_TIMEOUTS, **(timeouts or {})}
+    timings = {}
+    errors = {}
+    start = time.perf_counter()
+
+    async def text_then_fluency():
+        text = await _stage("stt", transcribe(), timeouts["stt"], timings, errors)
+        if not text:
+            return text or "", None
+        fluency = await _stage("fluency", fluency_score(client, text), timeouts["fluency"], timings, errors)
+        return text, fluency
+
+    emotion, pronunciation, (text, fluency) = await asyncio.gather(
+        _stage("emotion", detect_emotion(client, audio), timeouts["emotion"], timings, errors),
+        _stage("pronunciation", pronunciation_score(client, audio), timeouts["pronunciation"], timings, errors),
+        text_then_fluency(),
+    )
+
+    timings["total"] = round(time.perf_counter() - start, 3)
+    metrics.tracker("analysis.total").observe(timings["total"])
+    return {
+        "text": text,
+        "emotion": emotion,
+        "fluency": fluency,
+        "pronunciation": pronunciation,
+        "timings": timings,
+        "errors": errors,
+    }
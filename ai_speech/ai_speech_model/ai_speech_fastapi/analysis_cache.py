@@ -0,0 +1,137 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+
+import metrics
+from model_registry import GRAMMAR_MODEL_ID
+from stt_backends import get_stt_backend
+from ttl_cache import TTLCache
+
+
+logger = logging.getLogger("essay")
+
+# Bump when the scoring service behind CPU_API_BASE changes its models.
+SCORING_MODEL_VERSION = os.getenv("SCORING_MODEL_VERSION", "1")
+
+MODEL_VERSIONS = {
+    "emotion": SCORING_MODEL_VERSION,
+    "pronunciation": SCORING_MODEL_VERSION,
+    "fluency": SCORING_MODEL_VERSION,
+    "grammar": GRAMMAR_MODEL_ID,
+}
+
+
+def model_version(kind: str) -> str:
+    # The STT backend is only resolved once something is actually cached under it.
+    if kind == "stt":
+        return get_stt_backend().version
+    return MODEL_VERSIONS.get(kind, "")
+
+
+class AnalysisCache:
+    """Content-addressed cache for STT and scoring results.
+
+    Keys are the sha256 of the model version plus the input: the PCM bytes
+    and format of an AudioBuffer, or the whitespace- and case-normalized
+    text. Lookups go through an in-process TTL/LRU first, then Redis (once
+    `configure` has been given a client). None results are never cached, so
+    a failed call is retried next time. Redis errors only cost the cache,
+    never the analysis.
+    """
+
+    def __init__(self, prefix="analysis", maxsize=4096, local_ttl=3600, redis_ttl=7 * 24 * 3600):
+        self.prefix = prefix
+        self.redis_ttl = redis_ttl
+        self.local = TTLCache(maxsize=maxsize, ttl=local_ttl)
+        self.redis = None
+
+    def configure(self, redis_client):
+        self.redis = redis_client
+
+    def key(self, kind: str, payload) -> str:
+        digest = hashlib.sha256(f"{kind}:{model_version(kind)}:".encode())
+        if isinstance(payload, str):
+            digest.update(" ".join(payload.lower().split()).encode())
+        else:
+            digest.update(f"{payload.sample_rate}:{payload.channels}:{payload.sample_width}:".encode())
+            digest.update(payload.pcm)
+        return f"{self.prefix}:{kind}:{digest.hexdigest()}"
+
+    def _record(self, kind, outcome):
+        metrics.counter(f"analysis_cache.{kind}.{outcome}").inc()
+        hits = sum(metrics.counter(f"analysis_cache.{kind}.{o}").value for o in ("hit_local", "hit_redis"))
+        total = hits + metrics.counter(f"analysis_cache.{kind}.miss").value
+        metrics.gauge(f"analysis_cache.{kind}.hit_rate").set(round(hits / total, 3))
+        metrics.gauge("analysis_cache.local_size").set(len(self.local))
+
+    def _redis_get(self, key):
+        if self.redis is None:
+            return None
+        try:
+            raw = self.redis.get(key)
+            return json.loads(raw) if raw is not None else None
+        except Exception as e:
+            logger.warning(f"[Cache] Redis read failed for {key}: {e}")
+            return None
+
+    def _redis_set(self, key, value):
+        if self.redis is None:
+            return
+        try:
+            self.redis.setex(key, self.redis_ttl, json.dumps(value))
+        except Exception as e:
+            logger.warning(f"[Cache] Redis write failed for {key}: {e}")
+
+    def _lookup_local(self, kind, key):
+        value = self.local.get(key)
+        if value is not None:
+            self._record(kind, "hit_local")
+        return value
+
+    def _store(self, kind, key, value, remote):
+        if remote is not None:
+            self.local.set(key, remote)
+            self._record(kind, "hit_redis")
+            return remote
+        self._record(kind, "miss")
+        if value is not None:
+            self.local.set(key, value)
+        return value
+
+    async def get_or_compute(self, kind: str, payload, compute):
+        """Cached result of `await compute()` for this input."""
+        key = self.key(kind, payload)
+        value = self._lookup_local(kind, key)
+        if value is not None:
+            return value
+        remote = await asyncio.to_thread(self._redis_get, key)
+        if remote is not None:
+            return self._store(kind, key, None, remote)
+        value = await compute()
+        self._store(kind, key, value, None)
+        if value is not None:
+            await asyncio.to_thread(self._redis_set, key, value)
+        return value
+
+    def get_or_compute_sync(self, kind: str, payload, compute):
+        """Blocking variant for worker threads and processes."""
+        key = self.key(kind, payload)
+        value = self._lookup_local(kind, key)
+        if value is not None:
+            return value
+        remote = self._redis_get(key)
+        if remote is not None:
+            return self._store(kind, key, None, remote)
+        value = compute()
+        self._store(kind, key, value, None)
+        if value is not None:
+            self._redis_set(key, value)
+        return value
+
+
+analysis_cache = AnalysisCache(
+    maxsize=int(os.getenv("ANALYSIS_CACHE_SIZE", 4096)),
+    redis_ttl=int(os.getenv("ANALYSIS_CACHE_TTL", 7 * 24 * 3600)),
+)
@@ -0,0 +1,132 @@
+import os
+import struct
+
+import numpy as np
+import soundfile as sf
+
+from tts_engine import write_atomic
+
+
+def wav_header(data_bytes: int, sample_rate=16000, channels=1, sample_width=2) -> bytes:
+    """44-byte canonical PCM WAV header for `data_bytes` bytes of samples."""
+    byte_rate = sample_rate * channels * sample_width
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", 36 + data_bytes, b"WAVE",
+        b"fmt ", 16, 1, channels, sample_rate, byte_rate, channels * sample_width, sample_width * 8,
+        b"data", data_bytes,
+    )
+
+
+class AudioBuffer:
+    """One received utterance, kept in memory and shared by every consumer.
+
+    Wraps the raw PCM without copying it. The WAV encoding is built the
+    first time it is asked for and then reused, so the emotion and
+    pronunciation uploads, STT and VAD all read the same bytes. Nothing
+    touches the disk unless `archive` is called.
+    """
+
+    __slots__ = ("_pcm", "_wav", "sample_rate", "channels", "sample_width", "name")
+
+    def __init__(self, pcm, sample_rate=16000, channels=1, sample_width=2, name="audio.wav"):
+        self._pcm = memoryview(pcm).toreadonly()
+        self._wav = None
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.sample_width = sample_width
+        self.name = name
+
+    @classmethod
+    def from_file(cls, path: str) -> "AudioBuffer":
+        """Load a WAV (or anything soundfile reads) as 16-bit PCM."""
+        samples, sample_rate = sf.read(path, dtype="int16", always_2d=True)
+        return cls(samples.tobytes(), sample_rate=sample_rate, channels=samples.shape[1],
+                   name=os.path.basename(path))
+
+    def __len__(self):
+        return self._pcm.nbytes
+
+    @property
+    def pcm(self) -> memoryview:
+        return self._pcm
+
+    @property
+    def duration(self) -> float:
+        return len(self) / (self.sample_rate * self.channels * self.sample_width)
+
+    @property
+    def wav(self) -> bytes:
+        if self._wav is None:
+            self._wav = wav_header(len(self), self.sample_rate, self.channels, self.sample_width) + self._pcm.tobytes()
+        return self._wav
+
+    def to_numpy(self) -> np.ndarray:
+        """float32 samples in [-1, 1], shape (channels, frames)."""
+        samples = np.frombuffer(self._pcm, dtype=np.int16).astype(np.float32) / 32768.0
+        return samples.reshape(-1, self.channels).T
+
+    def to_tensor(self):
+        import torch
+
+        return torch.from_numpy(self.to_numpy())
+
+    def archive(self, path: str) -> str:
+        write_atomic(path, self.wav)
+        return path
+
+
+class PcmAccumulator:
+    """Per-session int16 buffer that collects websocket frames into one utterance.
+
+    Frames are copied into a preallocated array that grows geometrically, so
+    buffering an utterance is linear in its length. `view` hands out a
+    zero-copy memoryview; `reset` starts a fresh array rather than reusing
+    the old one, so a view still held by an in-flight analysis is never
+    overwritten.
+    """
+
+    def __init__(self, sample_rate=16000, max_seconds=None, initial_seconds=5.0):
+        self.sample_rate = sample_rate
+        self.max_seconds = max_seconds
+        self._initial = int(initial_seconds * sample_rate)
+        self._samples = np.empty(self._initial, dtype=np.int16)
+        self._length = 0
+
+    def __len__(self):
+        return self._length
+
+    @property
+    def duration(self) -> float:
+        return self._length / self.sample_rate
+
+    @property
+    def full(self) -> bool:
+        return self.max_seconds is not None and self.duration >= self.max_seconds
+
+    def append(self, pcm):
+        frame = np.frombuffer(pcm, dtype=np.int16, count=memoryview(pcm).nbytes // 2)
+        needed = self._length + len(frame)
+        if needed > len(self._samples):
+            grown = np.empty(max(len(self._samples) * 2, needed), dtype=np.int16)
+            grown[:self._length] = self._samples[:self._length]
+            self._samples = grown
+        self._samples[self._length:needed] = frame
+        self._length = needed
+
+    def keep_last(self, seconds: float):
+        """Drop everything but the most recent `seconds` of audio."""
+        keep = int(seconds * self.sample_rate)
+        if self._length > keep:
+            self._samples[:keep] = self._samples[self._length - keep:self._length]
+            self._length = keep
+
+    def view(self) -> memoryview:
+        return memoryview(self._samples[:self._length]).cast("B").toreadonly()
+
+    def to_buffer(self, name="audio.wav") -> AudioBuffer:
+        return AudioBuffer(self.view(), sample_rate=self.sample_rate, name=name)
+
+    def reset(self):
+        self._samples = np.empty(self._initial, dtype=np.int16)
+        self._length = 0
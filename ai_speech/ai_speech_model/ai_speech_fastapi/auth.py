@@ -1,18 +1,26 @@
-import os, datetime
+import os, datetime, asyncio
+from concurrent.futures import ThreadPoolExecutor
 from jose import jwt, JWTError
 from passlib.context import CryptContext
 from fastapi import HTTPException, status, Depends
 from fastapi.security import OAuth2PasswordBearer
 from fastapi_sqlalchemy import db
 from schemas import UserOut
+import metrics
+from revocation import revocation_store
 
 SECRET_KEY     = os.getenv("JWT_SECRET", "unsafe")
 ALGORITHM      = os.getenv("JWT_ALGORITHM", "HS256")
 EXPIRE_MINUTES = int(os.getenv("JWT_EXPIRE_MINUTES", 60))
 
-pwd_ctx  = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# bcrypt cost factor for new hashes; existing hashes verify at whatever cost they were made with.
+BCRYPT_ROUNDS  = int(os.getenv("BCRYPT_ROUNDS", 12))
+# Threads doing bcrypt, and how many hash/verify calls may wait for one before we shed load.
+PASSWORD_WORKERS     = int(os.getenv("PASSWORD_WORKERS", os.cpu_count() or 2))
+PASSWORD_MAX_PENDING = int(os.getenv("PASSWORD_MAX_PENDING", 64))
+
+pwd_ctx  = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 oauth2   = OAuth2PasswordBearer(tokenUrl="/login")
-_blacklist: set[str] = set()
 
 # ---------------- password helpers ----------------
 def hash_password(password: str) -> str:
@@ -21,6 +29,31 @@ def hash_password(password: str) -> str:
 def verify_password(password: str, hashed: str) -> bool:
     return pwd_ctx.verify(password, hashed)
 
+# bcrypt releases the GIL, so a small dedicated pool keeps it off the event
+# loop and out of the default executor that file and model work share.
+_password_pool = ThreadPoolExecutor(max_workers=PASSWORD_WORKERS, thread_name_prefix="bcrypt")
+_password_pending = 0
+
+async def _run_password(name, fn, *args):
+    global _password_pending
+    if _password_pending >= PASSWORD_MAX_PENDING:
+        metrics.counter("auth.bcrypt.rejected").inc()
+        raise HTTPException(status.HTTP_503_SERVICE_UNAVAILABLE, "Too many sign-ins at once, try again shortly")
+    _password_pending += 1
+    metrics.gauge("auth.bcrypt.pending").set(_password_pending)
+    try:
+        with metrics.tracker(f"auth.bcrypt.{name}").time():
+            return await asyncio.get_running_loop().run_in_executor(_password_pool, fn, *args)
+    finally:
+        _password_pending -= 1
+        metrics.gauge("auth.bcrypt.pending").set(_password_pending)
+
+async def hash_password_async(password: str) -> str:
+    return await _run_password("hash", hash_password, password)
+
+async def verify_password_async(password: str, hashed: str) -> bool:
+    return await _run_password("verify", verify_password, password, hashed)
+
 # ---------------- JWT helpers ---------------------
 def create_access_token(data: dict) -> str:
     payload = data.copy()
@@ -35,8 +68,8 @@ def decode_token(token: str) -> dict:
         raise HTTPException(status.HTTP_401_UNAUTHORIZED, "Invalid token")
 
 # -------------- dependency: current user ----------
-def get_current_user(token: str = Depends(oauth2)) -> UserOut:
-    if token in _blacklist:
+async def get_current_user(token: str = Depends(oauth2)) -> UserOut:
+    if await revocation_store.is_revoked(token):
         raise HTTPException(status.HTTP_401_UNAUTHORIZED, "Token revoked. Log in again.")
     payload = decode_token(token)
     user_id = payload.get("sub")
@@ -46,5 +79,16 @@ def get_current_user(token: str = Depends(oauth2)) -> UserOut:
     return UserOut.from_orm(user)
 
 # -------------- logout helper ---------------------
-def blacklist_token(token: str):
-    _blacklist.add(token)
+async def blacklist_token(token: str):
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return  # expired or not ours: already rejected everywhere
+    await revocation_store.revoke(token, payload["exp"])
+
+async def verify_token(token: str) -> dict:
+    """Claims of a valid, unrevoked token; raises 401 otherwise."""
+    payload = decode_token(token)
+    if await revocation_store.is_revoked(token):
+        raise HTTPException(status.HTTP_401_UNAUTHORIZED, "Token revoked. Log in again.")
+    return payload
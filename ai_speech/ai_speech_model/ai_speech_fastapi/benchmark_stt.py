@@ -0,0 +1,69 @@
+"""Real-time factor and throughput of an STT backend as concurrency grows.
+
+For each concurrency level, that many copies of the clip are transcribed at
+once. Reported per level: wall time, mean per-request RTF (latency / audio
+seconds) and throughput in audio seconds transcribed per wall second. The
+local backend should gain throughput with concurrency as requests share
+batches; the hosted one is bounded by the remote endpoint.
+
+Usage: python benchmark_stt.py --backend local [--wav sample.wav] [--levels 1,2,4,8] [--seconds 5]
+"""
+import argparse
+import asyncio
+import time
+
+import numpy as np
+
+from audio_buffer import AudioBuffer
+from http_client import http_client
+from stt_backends import create_backend
+
+SAMPLE_RATE = 16000
+
+
+def synthetic_clip(seconds: float) -> AudioBuffer:
+    # Amplitude-modulated harmonics: speech-like enough to exercise decoding.
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    envelope = 0.5 * (1 + np.sin(2 * np.pi * 3 * t))
+    signal = sum(np.sin(2 * np.pi * f * t) / i for i, f in enumerate((180, 360, 720, 1440), start=1))
+    samples = (0.2 * envelope * signal * 32767).astype("<i2")
+    return AudioBuffer(samples.tobytes(), sample_rate=SAMPLE_RATE, name="synthetic.wav")
+
+
+async def run_level(backend, audio, concurrency):
+    async def one():
+        start = time.perf_counter()
+        await backend.transcribe(audio)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*(one() for _ in range(concurrency)))
+    wall = time.perf_counter() - start
+    rtf = sum(latencies) / len(latencies) / audio.duration
+    throughput = concurrency * audio.duration / wall
+    print(f"concurrency {concurrency:3d}  wall {wall:6.2f}s  RTF {rtf:.3f}  throughput {throughput:6.1f} audio-s/s")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backend", default="local")
+    parser.add_argument("--wav")
+    parser.add_argument("--levels", default="1,2,4,8")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args()
+
+    audio = AudioBuffer.from_file(args.wav) if args.wav else synthetic_clip(args.seconds)
+    backend = create_backend(args.backend)
+    await http_client.start()
+    try:
+        start = time.perf_counter()
+        await backend.transcribe(audio)
+        print(f"{args.backend}: load + warm-up {time.perf_counter() - start:.2f}s, clip {audio.duration:.1f}s")
+        for level in (int(x) for x in args.levels.split(",")):
+            await run_level(backend, audio, level)
+    finally:
+        await http_client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
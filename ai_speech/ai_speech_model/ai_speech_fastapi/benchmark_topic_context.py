@@ -0,0 +1,64 @@
+"""Extraction time and prompt size: BeautifulSoup full-page text vs lxml + top-K condensing.
+
+Runs over the saved Wikipedia pages in fixtures/topic_pages (one file per
+topic, named like the article). Token counts are estimated at 4/3 tokens
+per word.
+
+Usage: python benchmark_topic_context.py [--runs 20] [--top-k 5] [--max-words 600]
+"""
+import argparse
+import glob
+import os
+import time
+
+from bs4 import BeautifulSoup
+
+from topic_context import condense, extract_paragraphs
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "topic_pages")
+
+
+def legacy_text(html: str) -> str:
+    soup = BeautifulSoup(html, "html.parser")
+    for tag in soup(["script", "style", "noscript"]):
+        tag.decompose()
+    return soup.get_text(separator="\n", strip=True)
+
+
+def tokens(text: str) -> int:
+    return len(text.split()) * 4 // 3
+
+
+def best_of(runs, fn, *args):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = fn(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--max-words", type=int, default=600)
+    args = parser.parse_args()
+
+    for path in sorted(glob.glob(os.path.join(FIXTURES, "*.html"))):
+        with open(path, encoding="utf-8") as f:
+            html = f.read()
+        topic = os.path.splitext(os.path.basename(path))[0].replace("_", " ")
+
+        legacy_seconds, legacy = best_of(args.runs, legacy_text, html)
+        lxml_seconds, paragraphs = best_of(args.runs, extract_paragraphs, html)
+        context = condense(paragraphs, topic, top_k=args.top_k, max_words=args.max_words)
+
+        print(f"{topic:16s} {len(html) / 1024:6.1f} KB  "
+              f"html.parser {legacy_seconds * 1000:7.2f} ms / {tokens(legacy):5d} tok  "
+              f"lxml {lxml_seconds * 1000:6.2f} ms / {tokens(context):5d} tok "
+              f"({len(paragraphs)} paragraphs)")
+
+
+if __name__ == "__main__":
+    main()
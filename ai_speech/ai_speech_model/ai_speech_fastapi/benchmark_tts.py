@@ -0,0 +1,45 @@
+"""Real-time factor of the warm Kokoro TtsEngine (synthesis seconds / audio seconds).
+
+Usage: python benchmark_tts.py [--runs 3] [--voice af_heart]
+"""
+import argparse
+import time
+
+from model_registry import registry
+from tts_engine import tts_engine
+
+TEXTS = [
+    "Hello! Let's talk about the water cycle today.",
+    "Water evaporates from oceans and lakes, rises into the sky, and cools into clouds. "
+    "When the droplets grow heavy enough they fall back to the ground as rain or snow.",
+    "Photosynthesis is how plants make their own food. Using sunlight, water from the soil and "
+    "carbon dioxide from the air, a plant produces glucose and releases oxygen. This process "
+    "happens mostly in the leaves, inside tiny structures called chloroplasts, and it is the "
+    "reason almost every living thing on Earth has energy to grow. Would you like an example?",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--voice", default=tts_engine.default_voice)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    registry.get("kokoro")
+    tts_engine.synthesize("Warm up.", args.voice)
+    print(f"pipeline load + warm-up: {time.perf_counter() - start:.2f}s")
+
+    for text in TEXTS:
+        timings = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            wav_bytes = tts_engine.synthesize_wav(text, args.voice)
+            timings.append(time.perf_counter() - start)
+        audio_seconds = (len(wav_bytes) - 44) / 2 / tts_engine.sample_rate
+        best = min(timings)
+        print(f"{len(text):4d} chars  audio {audio_seconds:6.2f}s  synth {best:6.2f}s  RTF {best / audio_seconds:.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Windows/sec of the old per-window Silero loop vs the batched SileroVadEngine.
+
+Usage: python benchmark_vad.py [--seconds 60] [--batch-size 1024]
+"""
+import argparse
+import math
+import time
+
+import torch
+
+from vad_engine import SileroVadEngine
+
+MODEL_PATH = "silero_vad/silero-vad/src/silero_vad/data/silero_vad.jit"
+
+
+def synthetic_clip(seconds, sample_rate=16000):
+    """Alternating 1.5 s voiced bursts and 1 s pauses over low noise."""
+    torch.manual_seed(0)
+    t = torch.arange(int(seconds * sample_rate)) / sample_rate
+    voiced = (torch.remainder(t, 2.5) < 1.5).float()
+    tone = 0.5 * torch.sin(2 * math.pi * 180 * t) + 0.3 * torch.sin(2 * math.pi * 720 * t)
+    return (tone * voiced + 0.01 * torch.randn_like(t)).unsqueeze(0)
+
+
+def legacy_scores(model, wav, sample_rate, window_size, hop_size):
+    """The loop Topic._silvero_vad_sync used before: one forward + .item() per window."""
+    probs = []
+    for i in range(0, len(wav) - window_size + 1, hop_size):
+        chunk = wav[i:i + window_size].unsqueeze(0)
+        with torch.no_grad():
+            probs.append(model(chunk, sample_rate).item())
+    return probs
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=60.0)
+    parser.add_argument("--batch-size", type=int, default=1024)
+    parser.add_argument("--model", default=MODEL_PATH)
+    args = parser.parse_args()
+
+    model = torch.jit.load(args.model)
+    model.eval()
+    engine = SileroVadEngine(model, batch_size=args.batch_size)
+
+    clip = synthetic_clip(args.seconds)
+    wav = engine.prepare(clip, engine.sample_rate)
+    windows = engine.frame(wav).shape[0]
+
+    start = time.perf_counter()
+    legacy_scores(model, wav, engine.sample_rate, engine.window_size, engine.hop_size)
+    legacy_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    result = engine.analyse(clip, engine.sample_rate)
+    batched_elapsed = time.perf_counter() - start
+
+    print(f"clip: {args.seconds:.0f}s, {windows} windows (window={engine.window_size}, hop={engine.hop_size})")
+    print(f"per-window loop : {legacy_elapsed:8.3f}s  {windows / legacy_elapsed:12.0f} windows/s")
+    print(f"batched engine  : {batched_elapsed:8.3f}s  {windows / batched_elapsed:12.0f} windows/s")
+    print(f"speedup         : {legacy_elapsed / batched_elapsed:.1f}x")
+    print(f"segments found  : {len(result['segments'])}, max gap {result['duration']:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import asyncio
+import logging
+
+import metrics
+from llm_gateway import llm_gateway
+from prompt_budget import render_messages, token_counter
+
+
+logger = logging.getLogger("essay")
+
+SUMMARY_PROMPT = """Summarize this conversation between a student and a teaching assistant in at most {words} words.
+Keep what the student said about themselves, the questions they asked and what has already been explained.
+Write plain sentences, no lists.
+
+Summary so far:
+{summary}
+
+New messages:
+{messages}
+
+Updated summary:"""
+
+
+async def summarize_with_llm(summary: str, messages: list, words=120) -> str:
+    prompt = SUMMARY_PROMPT.format(words=words, summary=summary or "(none)", messages=render_messages(messages))
+    result = await llm_gateway.ainvoke(llm_gateway.llm(), prompt, name="memory_summary", background=True)
+    return str(result).strip()
+
+
+class ConversationMemory:
+    """Chat history for one assistant session with a bounded prompt footprint.
+
+    Every message is kept in `messages` for persistence, but only the last
+    `keep_turns` exchanges go into the prompt verbatim. Older ones are folded
+    into a running summary by `compact`, which runs in the background after
+    a reply has been sent, so summarization never delays a turn. Until a
+    summary pass finishes, the messages it covers are still rendered as is.
+    """
+
+    def __init__(self, summarize=summarize_with_llm, keep_turns=4, max_summary_tokens=250, counter=token_counter):
+        self.summarize = summarize
+        self.keep_messages = keep_turns * 2
+        self.max_summary_tokens = max_summary_tokens
+        self.counter = counter
+        self.messages = []
+        self.summary = ""
+        self._unsummarized = 0  # index in `messages` of the first message not yet in the summary
+        self._task = None
+
+    def __iter__(self):
+        return iter(self.messages)
+
+    def __len__(self):
+        return len(self.messages)
+
+    def add(self, message):
+        self.messages.append(message)
+
+    def _recent_start(self) -> int:
+        return max(len(self.messages) - self.keep_messages, 0)
+
+    def render(self) -> str:
+        """Summary of older turns followed by the unsummarized messages, verbatim."""
+        parts = []
+        if self.summary:
+            parts.append(f"Summary of the earlier conversation: {self.summary}")
+        recent = render_messages(self.messages[self._unsummarized:])
+        if recent:
+            parts.append(recent)
+        text = "\n".join(parts)
+        metrics.tracker("assistant.memory.tokens").observe(self.counter.count(text))
+        return text
+
+    async def arender(self) -> str:
+        """`render` in a worker thread, since counting tokens blocks."""
+        return await asyncio.to_thread(self.render)
+
+    def compact(self):
+        """Start summarizing turns that fell out of the verbatim window, if any and none running."""
+        if self._task is not None and not self._task.done():
+            return
+        end = self._recent_start()
+        if end <= self._unsummarized:
+            return
+        self._task = asyncio.create_task(self._summarize_until(end))
+
+    async def _summarize_until(self, end):
+        try:
+            with metrics.tracker("assistant.memory.summarize").time():
+                summary = await self.summarize(self.summary, self.messages[self._unsummarized:end])
+        except Exception as e:
+            # Keep the turns verbatim and try again after the next reply.
+            logger.warning(f"[Memory] Summarization failed: {e}")
+            return
+        self.summary = await asyncio.to_thread(self.counter.truncate, summary, self.max_summary_tokens)
+        self._unsummarized = end
+
+    def close(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
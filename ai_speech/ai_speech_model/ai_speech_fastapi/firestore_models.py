@@ -1,4 +1,5 @@
-from firebase_config import db
+from datetime import datetime, timezone
+
 
 class FirestoreUser:
     def __init__(self, username, email, password, id=None):
@@ -25,8 +26,10 @@ class FirestoreUser:
 
 
 class FirestoreEssay:
-    def __init__(self, user_id, username, student_class, accent, topic, mood, content, id=None, chunks =None):
+    def __init__(self, user_id, username, student_class, accent, topic, mood, content, id=None, chunks =None, average_scores=None, created_at=None):
+        self.created_at = created_at
         self.chunks = chunks or []
+        self.average_scores = average_scores or {}
         self.id = id
         self.user_id = user_id
         self.username = username
@@ -46,6 +49,8 @@ class FirestoreEssay:
             "mood": self.mood,
             "content": self.content,
             "chunks": self.chunks,
+            "average_scores": self.average_scores,
+            "created_at": self.created_at or datetime.now(timezone.utc),
         }
 
 
@@ -59,5 +64,8 @@ class FirestoreEssay:
             accent=data.get("accent"),
             topic=data.get("topic"),
             mood=data.get("mood"),
-            content=data.get("content")
+            content=data.get("content"),
+            chunks=data.get("chunks"),
+            average_scores=data.get("average_scores"),
+            created_at=data.get("created_at")
         )
@@ -0,0 +1,128 @@
+import asyncio
+import logging
+import queue
+import re
+import threading
+import time
+from concurrent.futures import Future
+
+import torch
+
+import metrics
+from model_registry import registry
+
+
+logger = logging.getLogger("essay")
+
+
+class GrammarScorer:
+    """Resident CoLA grammar scorer.
+
+    Texts are split into sentences and every sentence goes through one shared
+    queue; a worker thread drains it into batches of up to `max_batch`
+    sentences, waiting at most `max_wait` seconds to fill a batch, so
+    concurrent requests share forward passes. A transcript's score is the
+    word-weighted mean acceptability of its sentences, out of 10.
+    """
+
+    def __init__(self, max_batch=32, max_wait=0.01, max_words=60, max_length=128):
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.max_words = max_words
+        self.max_length = max_length
+        self._queue = queue.Queue()
+        self._worker = None
+        self._start_lock = threading.Lock()
+
+    def split_sentences(self, text: str) -> list:
+        sentences = []
+        for sentence in re.split(r'(?<=[.?!])\s+', text.strip()):
+            words = sentence.split()
+            # Unpunctuated transcripts come back as one long run-on; cut it so nothing is truncated.
+            for i in range(0, len(words), self.max_words):
+                sentences.append(" ".join(words[i:i + self.max_words]))
+        return sentences
+
+    def _ensure_worker(self):
+        if self._worker is not None:
+            return
+        with self._start_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="grammar-scorer", daemon=True)
+                self._worker.start()
+
+    def _submit(self, sentences: list) -> list:
+        self._ensure_worker()
+        futures = []
+        for sentence in sentences:
+            future = Future()
+            self._queue.put((sentence, future))
+            futures.append(future)
+        return futures
+
+    def _run(self):
+        while True:
+            try:
+                batch = [self._queue.get()]
+                deadline = time.monotonic() + self.max_wait
+                while len(batch) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(self._queue.get(timeout=remaining))
+                    except queue.Empty:
+                        break
+                # Drop sentences whose caller has given up; the rest can no longer be cancelled.
+                batch = [item for item in batch if item[1].set_running_or_notify_cancel()]
+                if batch:
+                    self._score_batch(batch)
+            except Exception as e:
+                # The worker is started once, so it must outlive any single batch.
+                logger.error(f"[Grammar] Worker error: {e}")
+
+    def _score_batch(self, batch):
+        try:
+            tokenizer, model, device = registry.get("cola_grammar")
+            with metrics.tracker("grammar.batch").time():
+                inputs = tokenizer(
+                    [sentence for sentence, _ in batch],
+                    return_tensors="pt",
+                    truncation=True,
+                    padding=True,
+                    max_length=self.max_length
+                ).to(device)
+                with torch.no_grad():
+                    probs = torch.softmax(model(**inputs).logits, dim=1)[:, 1].tolist()
+            metrics.counter("grammar.sentences").inc(len(batch))
+            for (_, future), prob in zip(batch, probs):
+                future.set_result(prob)
+        except Exception as e:
+            logger.error(f"[Grammar] Batch of {len(batch)} failed: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+    def _aggregate(self, sentences, probs) -> float:
+        weights = [len(sentence.split()) for sentence in sentences]
+        prob = sum(p * w for p, w in zip(probs, weights)) / sum(weights)
+        return round(prob * 10, 2)
+
+    def score(self, text: str) -> float:
+        sentences = self.split_sentences(text or "")
+        if not sentences:
+            return 0.0
+        with metrics.tracker("grammar.score").time():
+            probs = [future.result() for future in self._submit(sentences)]
+            return self._aggregate(sentences, probs)
+
+    async def score_async(self, text: str) -> float:
+        sentences = self.split_sentences(text or "")
+        if not sentences:
+            return 0.0
+        with metrics.tracker("grammar.score").time():
+            probs = await asyncio.gather(*(asyncio.wrap_future(f) for f in self._submit(sentences)))
+            return self._aggregate(sentences, probs)
+
+
+grammar_scorer = GrammarScorer()
@@ -0,0 +1,142 @@
+import asyncio
+import logging
+import os
+import time
+from urllib.parse import urlsplit
+
+import aiohttp
+
+import metrics
+
+
+logger = logging.getLogger("essay")
+
+RETRY_STATUSES = {502, 503, 504}
+
+
+class HttpClient:
+    """One keep-alive aiohttp session per app, shared by every handler.
+
+    Connections are pooled with a global and a per-host limit; requests
+    beyond the per-host limit queue inside the connector, which is what the
+    http.pool.* metrics measure. Connection errors, timeouts and 502/503/504
+    responses are retried with exponential backoff.
+    """
+
+    def __init__(self, limit=100, limit_per_host=20, keepalive_timeout=30.0, timeout=60.0, retries=2, backoff=0.25):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self._session = None
+        self._in_flight = {}
+        self._start_lock = asyncio.Lock()
+
+    async def start(self):
+        # Concurrent first requests must not each open a session and leak all but one.
+        async with self._start_lock:
+            if self._session is None or self._session.closed:
+                self._open()
+
+    def _open(self):
+        trace = aiohttp.TraceConfig()
+        trace.on_connection_queued_start.append(self._on_queued_start)
+        trace.on_connection_queued_end.append(self._on_queued_end)
+        connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            keepalive_timeout=self.keepalive_timeout,
+            ttl_dns_cache=300,
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            trace_configs=[trace],
+        )
+        logger.info(f"[HTTP] Client started (limit={self.limit}, per host={self.limit_per_host})")
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            raise RuntimeError("HttpClient used before start()")
+        return self._session
+
+    async def _on_queued_start(self, session, ctx, params):
+        ctx.queued_at = time.perf_counter()
+        metrics.counter("http.pool.queued").inc()
+
+    async def _on_queued_end(self, session, ctx, params):
+        metrics.tracker("http.pool.queue_wait").observe(time.perf_counter() - ctx.queued_at)
+
+    def _track(self, host, delta):
+        self._in_flight[host] = self._in_flight.get(host, 0) + delta
+        metrics.gauge(f"http.in_flight.{host}").set(self._in_flight[host])
+        metrics.gauge("http.pool.saturation").set(
+            round(max(self._in_flight.values()) / self.limit_per_host, 2)
+        )
+
+    async def _request(self, method, url, read, build=None, **kwargs):
+        if self._session is None or self._session.closed:
+            await self.start()
+        host = urlsplit(url).netloc
+        attempt = 0
+        while True:
+            if build is not None:
+                # Request bodies like FormData can only be sent once; rebuild per attempt.
+                kwargs.update(build())
+            start = time.perf_counter()
+            self._track(host, 1)
+            try:
+                async with self.session.request(method, url, **kwargs) as res:
+                    if res.status in RETRY_STATUSES and attempt < self.retries:
+                        raise aiohttp.ClientResponseError(res.request_info, res.history, status=res.status)
+                    return await read(res)
+            except (aiohttp.ClientConnectionError, aiohttp.ClientResponseError, asyncio.TimeoutError) as e:
+                retryable = not isinstance(e, aiohttp.ClientResponseError) or e.status in RETRY_STATUSES
+                if not retryable or attempt >= self.retries:
+                    metrics.counter(f"http.errors.{host}").inc()
+                    raise
+                attempt += 1
+                metrics.counter("http.retries").inc()
+                delay = self.backoff * 2 ** (attempt - 1)
+                logger.warning(f"[HTTP] {method} {url} failed ({e!r}), retry {attempt} in {delay:.2f}s")
+            finally:
+                self._track(host, -1)
+                metrics.tracker(f"http.{host}").observe(time.perf_counter() - start)
+            await asyncio.sleep(delay)
+
+    @staticmethod
+    async def _read_json(res):
+        res.raise_for_status()
+        return await res.json(content_type=None)
+
+    async def post_json(self, url, payload, **kwargs) -> dict:
+        return await self._request("POST", url, self._read_json, json=payload, **kwargs)
+
+    async def post_bytes(self, url, data: bytes, headers=None) -> dict:
+        return await self._request("POST", url, self._read_json, data=data, headers=headers)
+
+    async def post_file(self, url, data: bytes, filename: str, field="file", content_type="audio/wav") -> dict:
+        def build():
+            form = aiohttp.FormData()
+            form.add_field(field, data, filename=filename, content_type=content_type)
+            return {"data": form}
+        return await self._request("POST", url, self._read_json, build=build)
+
+    async def get_text(self, url) -> tuple:
+        async def read(res):
+            return res.status, await res.text()
+        return await self._request("GET", url, read)
+
+
+http_client = HttpClient(
+    limit=int(os.getenv("HTTP_POOL_LIMIT", 100)),
+    limit_per_host=int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", 20)),
+)
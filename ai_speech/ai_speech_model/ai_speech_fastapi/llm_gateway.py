@@ -0,0 +1,137 @@
+import asyncio
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+
+import metrics
+from prompt_budget import LlmUsage
+
+
+logger = logging.getLogger("essay")
+
+LLM_MODEL = os.getenv("LLM_MODEL", "mistral")
+# How long Ollama keeps the model loaded after a request; -1 keeps it resident.
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "-1")
+# Generations allowed to run at once; the rest wait their turn here, not inside Ollama.
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 2))
+
+
+def _keep_alive(value: str):
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+
+class LlmGateway:
+    """Single entry point for every Ollama call in the app.
+
+    Clients are created once per (kind, model, settings) and reused, all
+    with `keep_alive` so the model stays resident between requests. Calls
+    are always async. At most `max_concurrency` generations run at once;
+    llm.queue_wait measures the time spent waiting for a slot and
+    llm.<name>.generation the time inside one. Token usage for each call is
+    logged through LlmUsage.
+
+    Background calls (e.g. memory summaries) have lower priority: they only
+    take a slot while no live call is waiting and at least one other slot
+    stays free, so they never hold up a reply.
+    """
+
+    def __init__(self, model=LLM_MODEL, keep_alive=OLLAMA_KEEP_ALIVE, max_concurrency=LLM_MAX_CONCURRENCY):
+        self.model = model
+        self.keep_alive = _keep_alive(keep_alive)
+        self.max_concurrency = max_concurrency
+        self._clients = {}
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._waiting = 0
+        self._running = 0
+        self._released = asyncio.Event()
+
+    def _client(self, kind, model, settings):
+        key = (kind, model or self.model, tuple(sorted(settings.items())))
+        client = self._clients.get(key)
+        if client is None:
+            from langchain_ollama import ChatOllama, OllamaLLM
+
+            cls = ChatOllama if kind == "chat" else OllamaLLM
+            client = cls(model=key[1], keep_alive=self.keep_alive, **settings)
+            self._clients[key] = client
+        return client
+
+    def chat(self, model=None, **settings):
+        """Shared ChatOllama for this model and settings (e.g. temperature)."""
+        return self._client("chat", model, settings)
+
+    def llm(self, model=None, **settings):
+        """Shared completion-style OllamaLLM for this model and settings."""
+        return self._client("llm", model, settings)
+
+    def _gauges(self):
+        metrics.gauge("llm.waiting").set(self._waiting)
+        metrics.gauge("llm.in_flight").set(self._running)
+
+    def _background_may_start(self):
+        return self._waiting == 0 and self._running < max(self.max_concurrency - 1, 1)
+
+    async def _acquire_background(self):
+        while not self._background_may_start():
+            self._released.clear()
+            await self._released.wait()
+        # Nothing can take the slot in between: acquire returns without yielding when one is free.
+        await self._semaphore.acquire()
+
+    @asynccontextmanager
+    async def slot(self, name, background=False):
+        queued = time.perf_counter()
+        if background:
+            await self._acquire_background()
+        else:
+            self._waiting += 1
+            self._gauges()
+            try:
+                await self._semaphore.acquire()
+            finally:
+                self._waiting -= 1
+                self._released.set()
+        started = time.perf_counter()
+        metrics.tracker("llm.background_wait" if background else "llm.queue_wait").observe(started - queued)
+        self._running += 1
+        self._gauges()
+        try:
+            yield
+        finally:
+            self._running -= 1
+            self._semaphore.release()
+            self._released.set()
+            self._gauges()
+            metrics.tracker(f"llm.{name}.generation").observe(time.perf_counter() - started)
+
+    @staticmethod
+    def _config(name, config):
+        config = dict(config or {})
+        config["callbacks"] = list(config.get("callbacks") or []) + [LlmUsage(name)]
+        return config
+
+    async def ainvoke(self, runnable, inputs, name, config=None, background=False):
+        """`runnable.ainvoke(inputs)` once a generation slot is free."""
+        async with self.slot(name, background):
+            return await runnable.ainvoke(inputs, config=self._config(name, config))
+
+    async def astream(self, runnable, inputs, name, config=None):
+        """`runnable.astream(inputs)`, holding one slot for the whole stream."""
+        async with self.slot(name):
+            async for chunk in runnable.astream(inputs, config=self._config(name, config)):
+                yield chunk
+
+    async def preload(self, model=None):
+        """Load the model into Ollama ahead of the first request."""
+        try:
+            await self.ainvoke(self.llm(model, num_predict=1), "Hi", name="preload")
+            logger.info(f"[LLM] '{model or self.model}' loaded (keep_alive={self.keep_alive})")
+        except Exception as e:
+            logger.warning(f"[LLM] Could not preload '{model or self.model}': {e}")
+
+
+llm_gateway = LlmGateway()
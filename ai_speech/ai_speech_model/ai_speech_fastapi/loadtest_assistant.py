@@ -0,0 +1,126 @@
+"""Load test: N concurrent /ws/assistant sessions while probing /health latency.
+
+Each session streams 0.5 s PCM frames in real time (speech-like bursts, then
+silence so the server replies). Meanwhile one probe hits /health every
+100 ms. If any session blocks the event loop (e.g. a time.sleep during
+playback), the probe's p99 jumps by the length of a spoken reply.
+
+The websocket only accepts a token logged in as the session's username, so
+every session needs its own account. Either pass a file of
+"username token" lines, or let the script log in loadtest0..N-1 with one
+password (--register creates those accounts first).
+
+Usage: python loadtest_assistant.py --base http://localhost:8000 --password <pw> [--register] [--sessions 8] [--seconds 60]
+       python loadtest_assistant.py --base http://localhost:8000 --credentials users.txt [--seconds 60]
+"""
+import argparse
+import asyncio
+import math
+import struct
+import time
+
+import aiohttp
+
+SAMPLE_RATE = 16000
+FRAME_SECONDS = 0.5
+
+
+def frame(voiced: bool, offset: int) -> bytes:
+    samples = int(SAMPLE_RATE * FRAME_SECONDS)
+    if not voiced:
+        return bytes(samples * 2)
+    return struct.pack(
+        f"<{samples}h",
+        *(int(8000 * math.sin(2 * math.pi * 220 * (offset + i) / SAMPLE_RATE)) for i in range(samples))
+    )
+
+
+def read_credentials(path):
+    with open(path, encoding="utf-8") as f:
+        return [tuple(line.split()[:2]) for line in f if line.strip() and not line.startswith("#")]
+
+
+async def log_in(http, args, index):
+    username = f"{args.prefix}{index}"
+    if args.register:
+        # 400 means the account already exists, which is fine
+        async with http.post(f"{args.base}/register", json={
+            "username": username, "email": f"{username}@example.com", "password": args.password
+        }):
+            pass
+    async with http.post(f"{args.base}/login", json={"username": username, "password": args.password}) as res:
+        res.raise_for_status()
+        return username, (await res.json())["access_token"]
+
+
+async def run_session(http, args, username, token, stop):
+    url = (
+        f"{args.base.replace('http', 'ws', 1)}/ws/assistant?username={username}&token={token}"
+        f"&topic=Water&student_class=8&mood=happy&accent=english"
+    )
+    async with http.ws_connect(url, max_msg_size=0) as ws:
+        async def drain():
+            async for _ in ws:
+                pass
+
+        reader = asyncio.create_task(drain())
+        offset = 0
+        while not stop.is_set():
+            # 3 s of "speech", then 3 s of silence to end the utterance
+            for step in range(12):
+                await ws.send_bytes(frame(step < 6, offset))
+                offset += int(SAMPLE_RATE * FRAME_SECONDS)
+                await asyncio.sleep(FRAME_SECONDS)
+                if stop.is_set():
+                    break
+        reader.cancel()
+
+
+async def probe(http, args, stop, latencies):
+    while not stop.is_set():
+        start = time.perf_counter()
+        async with http.get(f"{args.base}/health") as res:
+            await res.read()
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(0.1)
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[max(math.ceil(p / 100 * len(values)) - 1, 0)] if values else 0.0
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--base", default="http://localhost:8000")
+    credentials = parser.add_mutually_exclusive_group(required=True)
+    credentials.add_argument("--credentials", help='file of "username token" lines, one session per line')
+    credentials.add_argument("--password", help="password shared by the loadtest accounts")
+    parser.add_argument("--prefix", default="loadtest")
+    parser.add_argument("--register", action="store_true")
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=60.0)
+    args = parser.parse_args()
+
+    stop = asyncio.Event()
+    latencies = []
+    async with aiohttp.ClientSession() as http:
+        if args.credentials:
+            users = read_credentials(args.credentials)
+        else:
+            users = await asyncio.gather(*(log_in(http, args, i) for i in range(args.sessions)))
+        args.sessions = len(users)
+        tasks = [asyncio.create_task(run_session(http, args, username, token, stop)) for username, token in users]
+        tasks.append(asyncio.create_task(probe(http, args, stop, latencies)))
+        await asyncio.sleep(args.seconds)
+        stop.set()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    print(f"sessions: {args.sessions}, probes: {len(latencies)}")
+    print(f"/health p50 {percentile(latencies, 50) * 1000:.1f} ms  "
+          f"p99 {percentile(latencies, 99) * 1000:.1f} ms  "
+          f"max {max(latencies, default=0) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
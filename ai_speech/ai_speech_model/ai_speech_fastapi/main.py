@@ -9,7 +9,7 @@ from langchain_core.output_parsers import StrOutputParser
 from collections import Counter
 import ujson as json
 import redis
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from fastapi import FastAPI, Depends, HTTPException, status, Request, WebSocket, WebSocketDisconnect, UploadFile, File, Form, Query
 from fastapi.middleware.cors import CORSMiddleware
 from pydub import AudioSegment
@@ -25,7 +25,7 @@ import os, shutil, uuid
 from PIL import Image
 import google.generativeai as genai
 from pinecone import Pinecone
-from auth import hash_password, verify_password, create_access_token
+from auth import hash_password_async, verify_password_async, create_access_token, blacklist_token, verify_token
 from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_community.vectorstores import Pinecone as PineconeVectorStore
 import torch
@@ -57,8 +57,8 @@ import docx2txt
 from pptx import Presentation
 import requests
 from bs4 import BeautifulSoup
-from firestore_models import FirestoreEssay
-from firebase import db
+from firestore_models import FirestoreEssay, FirestoreUser
+from repository import users, essays, UsernameTaken
 from concurrent.futures import ProcessPoolExecutor
 process_pool = ProcessPoolExecutor()
 import requests
@@ -76,8 +76,27 @@ from urllib.parse import parse_qs
 from fastapi import WebSocket, WebSocketDisconnect
 from pydub import AudioSegment
 import aiohttp
-CPU_API_BASE = "http://13.200.201.10:8000"
-model_name = OllamaLLM(model="mistral")
+from model_registry import registry
+import metrics
+import io
+import wave
+from tts_engine import tts_engine, SentenceSplitter, encode_pcm16
+from analysis import analyse_utterance, CPU_API_BASE
+from audio_buffer import AudioBuffer, PcmAccumulator
+from recording import WavRecorder
+from stt_backends import get_stt_backend
+from analysis_cache import analysis_cache
+from topic_context import topic_context
+from prompt_budget import PromptBudget, Section, token_counter
+from llm_gateway import llm_gateway
+from conversation_memory import ConversationMemory
+from streaming_stt import StreamingTranscriber
+from http_client import http_client
+from tts_jobs import tts_jobs, TtsQueueFull
+from session_cache import session_cache
+from revocation import revocation_store
+import redis.asyncio as aioredis
+from fastapi.responses import StreamingResponse
 scraping_api_key = os.getenv("SCRAPINGDOG_API_KEY")
 
 PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
@@ -106,94 +125,220 @@ redis_client = redis.StrictRedis(
     password=os.getenv("REDIS_PASSWORD"),
     decode_responses=True
 )
+analysis_cache.configure(redis_client)
+topic_context.configure(redis_client, api_key=scraping_api_key)
+tts_jobs.configure(redis_client)
+async_redis_client = aioredis.Redis(
+    host=os.getenv("REDIS_HOST"),
+    port=int(os.getenv("REDIS_PORT")),
+    username=os.getenv("REDIS_USERNAME"),
+    password=os.getenv("REDIS_PASSWORD"),
+    decode_responses=True,
+    max_connections=int(os.getenv("REDIS_MAX_CONNECTIONS", 50))
+)
+session_cache.configure(async_redis_client)
+revocation_store.configure(async_redis_client)
 
 origins = ["https://llm.edusmartai.com","http://localhost:3000","http://localhost:5173"]
 
 app.add_middleware(CORSMiddleware, allow_origins=origins, allow_credentials=True, allow_methods=["*"], allow_headers=["*"])
 
-def get_user_from_redis_session(request: Request):
+WARMUP_MODELS = [name for name in os.getenv("WARMUP_MODELS", "silero_vad,vad_engine,cola_grammar,kokoro").split(",") if name]
+
+
+@app.on_event("startup")
+async def warmup_models():
+    await asyncio.to_thread(registry.warmup, WARMUP_MODELS)
+
+
+@app.on_event("startup")
+async def load_tokenizer():
+    # Downloads on first run; prompts fitted before it is ready wait in their worker thread.
+    asyncio.create_task(asyncio.to_thread(token_counter.load))
+
+
+@app.on_event("startup")
+async def start_http_client():
+    await http_client.start()
+
+
+@app.on_event("startup")
+async def preload_llm():
+    if os.getenv("LLM_PRELOAD", "1") == "1":
+        asyncio.create_task(llm_gateway.preload())
+
+
+@app.on_event("startup")
+async def start_tts_jobs():
+    await tts_jobs.start()
+
+
+@app.on_event("startup")
+async def start_session_cache():
+    await session_cache.start()
+    await revocation_store.start()
+
+
+@app.on_event("shutdown")
+async def close_http_client():
+    await http_client.close()
+
+
+@app.on_event("shutdown")
+async def stop_tts_jobs():
+    await tts_jobs.close()
+
+
+@app.on_event("shutdown")
+async def close_session_cache():
+    await session_cache.close()
+    await revocation_store.close()
+    close = getattr(async_redis_client, "aclose", None) or async_redis_client.close
+    await close()
+
+
+@app.get("/health/models")
+def model_stats():
+    return registry.stats()
+
+
+@app.get("/metrics")
+def metrics_snapshot():
+    return metrics.snapshot()
+
+
+async def get_user_from_redis_session(request: Request):
     token = request.headers.get("Authorization")
     if not token or not token.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Missing or invalid token")
     token = token.split(" ")[1]
-    session_data = redis_client.get(f"session:{token}")
+    if await revocation_store.is_revoked(token):
+        raise HTTPException(status_code=401, detail="Token revoked. Log in again.")
+    session_data = await session_cache.get_session(token)
     if not session_data:
         raise HTTPException(status_code=401, detail="Session expired or invalid")
-    return json.loads(session_data)
+    return session_data
+
+
+async def authenticate_ws(username, token):
+    """Whether a websocket handshake's token is valid, unrevoked and logged in as `username`."""
+    if not username or not token:
+        return False
+    try:
+        await verify_token(token)
+    except HTTPException:
+        return False
+    session_data = await session_cache.get_session(token)
+    return session_data is not None and session_data.get("username") == username
+
+async def remember_active_essay(token, essay_id):
+    """Store the essay the user is about to read aloud in their login session, for /ws/audio."""
+    await session_cache.update_session(token, essay_id=essay_id)
+
+
+async def load_profile(user_id):
+    user = await users.get(user_id)
+    # Only public fields: profiles are cached in Redis, the password hash must not be
+    return {"id": user.id, "username": user.username, "email": user.email} if user else None
+
+
+async def resolve_active_essay(username, token, essay_id=None):
+    """Id of the essay a /ws/audio session belongs to, or None.
+
+    In order: the `essay_id` from the handshake (checked to belong to the
+    user), the one stored in the login session by /generate-prompt, then
+    the user's newest essay if it was created today.
+    """
+    if essay_id:
+        essay = await essays.get(essay_id)
+        return essay_id if essay is not None and essay.username == username else None
+
+    session_data = await session_cache.get_session(token)
+    essay_id = session_data.get("essay_id") if session_data else None
+    if essay_id:
+        return essay_id
+
+    essay = await essays.latest_for_user(username)
+    # Firestore returns UTC-aware timestamps, so "today" is the UTC day.
+    if essay is not None and essay.created_at.astimezone(timezone.utc).date() == datetime.now(timezone.utc).date():
+        return essay.id
+    return None
+
 
 @app.post("/register", response_model=UserOut)
-def register(user: UserCreate):
-    user_ref = db.collection("users").where("username", "==", user.username).stream()
-    if any(user_ref):
+async def register(user: UserCreate):
+    # Catches users registered before the usernames index; the transaction below settles races
+    if await users.find_by_username(user.username):
         raise HTTPException(400, "Username or email already exists")
 
-    doc_ref = db.collection("users").add({
-        "username": user.username,
-        "email": user.email,
-        "password": hash_password(user.password)
-    })
-    user_id = doc_ref[1].id
+    try:
+        user_id = await users.create(FirestoreUser(
+            username=user.username,
+            email=user.email,
+            password=await hash_password_async(user.password)
+        ))
+    except UsernameTaken:
+        raise HTTPException(400, "Username or email already exists")
     return UserOut(id=user_id, username=user.username, email=user.email)
 
 @app.post("/login", response_model=Token)
-def login(data: LoginRequest):
-    docs = db.collection("users").where("username", "==", data.username).stream()
-    user_doc = next(docs, None)
-    if not user_doc or not verify_password(data.password, user_doc.to_dict()["password"]):
-        raise HTTPException(status.HTTP_401_UNAUTHORIZED, detail="Bad credentials")
+async def login(data: LoginRequest):
+    # auth.login's per_second in /metrics is the login throughput
+    with metrics.tracker("auth.login").time():
+        user_doc = await users.find_by_username(data.username)
+        if not user_doc or not await verify_password_async(data.password, user_doc.password):
+            metrics.counter("auth.login.failed").inc()
+            raise HTTPException(status.HTTP_401_UNAUTHORIZED, detail="Bad credentials")
 
     token = create_access_token({"sub": user_doc.id})
-    redis_client.setex(f"session:{token}", timedelta(hours=1), json.dumps({"user_id": user_doc.id, "username": data.username}))
+    await session_cache.set_session(token, {"user_id": user_doc.id, "username": data.username}, ttl=int(timedelta(hours=1).total_seconds()))
     return Token(access_token=token, username=data.username)
 
 @app.get("/logout")
-def logout(request: Request):
+async def logout(request: Request):
     token = request.headers.get("Authorization")
     if token and token.startswith("Bearer "):
-        redis_client.delete(f"session:{token.split(' ')[1]}")
+        token = token.split(' ')[1]
+        await blacklist_token(token)
+        await session_cache.delete_session(token)
     return {"detail": "Logged out"}
 
 @app.get("/me", response_model=UserOut)
-def me(user=Depends(get_user_from_redis_session)):
-    doc = db.collection("users").document(user["user_id"]).get()
-    if not doc.exists:
+async def me(user=Depends(get_user_from_redis_session)):
+    profile = await session_cache.get_profile(user["user_id"], load_profile)
+    if profile is None:
         raise HTTPException(404, "User not found")
-    data = doc.to_dict()
-    return UserOut(id=doc.id, username=data["username"], email=data["email"])
+    return UserOut(**profile)
 
 
 
 @app.post("/generate-prompt")
-async def generate_prompt(data: GeminiRequest, user=Depends(get_user_from_redis_session)):
-    url = f"https://en.wikipedia.org/wiki/{data.topic}"
-    api_endpoint = f"https://api.scrapingdog.com/scrape?api_key={scraping_api_key}&url={url}"
+async def generate_prompt(data: GeminiRequest, request: Request, user=Depends(get_user_from_redis_session)):
+    # Cached, condensed to the most relevant paragraphs of the topic's page
+    text = await topic_context.get(data.topic)
 
-    text = ""
-    try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(api_endpoint) as response:
-                if response.status == 200:
-                    html = await response.text()
-                    soup = BeautifulSoup(html, "html.parser")
-                    for script in soup(["script", "style", "noscript"]):
-                        script.decompose()
-                    text = soup.get_text(separator="\n", strip=True)
-                else:
-                    logging.info(f"Error: {response.status} - {await response.text()}")
-    except Exception as e:
-        logging.exception(f"Failed to scrape data: {e}")
-
-    prompt = (
+    prompt_template = (
         f"Generate a essay for a student in class {data.student_class} with a {data.accent} accent, "
         f"on the topic '{data.topic}', and the mood is '{data.mood}' and give me essay should be less than 400 words "
-        f"and in response did not want \n\n or \n and also not want word count thanks you this type of stuff and used {text} "
+        f"and in response did not want \n\n or \n and also not want word count thanks you this type of stuff and used {{context}} "
         f"content for as updated data from internet and which is helpful in created essay and please give me output in paragraph format only not in points."
     )
+    context = (await PromptBudget("essay").afit(
+        [Section("context", text, max_tokens=1200)],
+        fixed=prompt_template.replace("{context}", "")
+    ))["context"]
+    prompt = prompt_template.replace("{context}", context)
 
     username = user.get("username")
     topic = Topic()
     response_text = await topic.topic_data_model_for_Qwen(username, prompt)
 
+    try:
+        tts_job_id = await tts_jobs.submit(response_text, username)
+    except TtsQueueFull as e:
+        logging.warning(f"[TTS jobs] Essay audio skipped for {username}: {e}")
+        tts_job_id = None
+
     essay_data = FirestoreEssay(
         username=username,
         user_id=user["user_id"],
@@ -201,15 +346,17 @@ async def generate_prompt(data: GeminiRequest, user=Depends(get_user_from_redis_
         accent=data.accent,
         topic=data.topic,
         mood=data.mood,
-        content=response_text
+        content=response_text,
+        created_at=datetime.now(timezone.utc)
     )
 
-    write_time, doc_ref = db.collection("essays").add(essay_data.to_dict())
-    essay_id = doc_ref.id
+    essay_id = await essays.create(essay_data)
+    await remember_active_essay(request.headers["Authorization"].split(" ")[1], essay_id)
 
     return JSONResponse(content={
         "response": response_text,
-        "essay_id": essay_id
+        "essay_id": essay_id,
+        "tts_job_id": tts_job_id
     })
 
 
@@ -233,12 +380,17 @@ async def audio_ws(websocket: WebSocket):
     username = query_params.get("username", [None])[0]
     token = query_params.get("token", [None])[0]
 
-    if not username or not token:
+    if not await authenticate_ws(username, token):
         await websocket.close(code=4001)
-        logging.info("Username or token missing.")
+        logging.info("Username or token missing or invalid.")
         return
 
     logging.info(f"[WS] Authenticated connection from {username}")
+    try:
+        essay_id = await resolve_active_essay(username, token, query_params.get("essay_id", [None])[0])
+    except Exception as e:
+        logging.error(f"[Firestore] Could not resolve the essay for {username}: {e}")
+        essay_id = None
     chunk_index = 0
     chunk_results = []
     text_output = []
@@ -254,8 +406,7 @@ async def audio_ws(websocket: WebSocket):
         os.remove(final_output)
     if os.path.exists(transcript_path):
         os.remove(transcript_path)
-
-    loop = asyncio.get_event_loop()
+    recorder = WavRecorder(final_output)
 
     try:
         topic = Topic()
@@ -267,44 +418,20 @@ async def audio_ws(websocket: WebSocket):
                 break
 
             if message["type"] == "websocket.receive" and "bytes" in message:
-                chunk_filename = os.path.join(user_dir, f"chunk_{chunk_index}.wav")
-                audio = AudioSegment(
-                    data=message["bytes"],
-                    sample_width=2,
-                    frame_rate=16000,
-                    channels=1
+                audio = AudioBuffer(message["bytes"], name=f"chunk_{chunk_index}.wav")
+                recorder.write(audio.pcm)
+
+                analysis = await analyse_utterance(
+                    http_client, audio,
+                    lambda: topic.speech_to_text(audio, username)
                 )
-                audio.export(chunk_filename, format="wav")
-
-                async with aiohttp.ClientSession() as session:
-                    # Emotion detection
-                    with open(chunk_filename, "rb") as f:
-                        form = aiohttp.FormData()
-                        form.add_field("file", f, filename=os.path.basename(chunk_filename), content_type="audio/wav")
-                        async with session.post(f"{CPU_API_BASE}/detect-emotion", data=form) as res:
-                            emotion_data = await res.json()
-                            emotion = emotion_data.get("emotion")
-
-                    # Speech-to-text
-                    transcribed_text = await topic.speech_to_text(chunk_filename, username)
-
-                    async with session.post(
-                        f"{CPU_API_BASE}/fluency-score",
-                        json={"text": transcribed_text}
-                    ) as res:
-                        fluency_data = await res.json()
-                        fluency = fluency_data.get("fluency")
-
-                    # Pronunciation
-                    with open(chunk_filename, "rb") as f:
-                        form = aiohttp.FormData()
-                        form.add_field("file", f, filename=os.path.basename(chunk_filename), content_type="audio/wav")
-                        async with session.post(f"{CPU_API_BASE}/pronunciation-score", data=form) as res:
-                            pron_data = await res.json()
-                            pronunciation = pron_data.get("pronunciation")
+                transcribed_text = analysis["text"]
+                emotion = analysis["emotion"]
+                fluency = analysis["fluency"]
+                pronunciation = analysis["pronunciation"]
 
                 # Silvero remains local
-                silvero = await topic.silvero_vad(chunk_filename)
+                silvero = await topic.silvero_vad(audio)
                 topic.update_realtime_stats(fluency, pronunciation, emotion)
 
                 text_output.append(transcribed_text)
@@ -316,7 +443,8 @@ async def audio_ws(websocket: WebSocket):
                     "fluency": fluency,
                     "pronunciation": pronunciation,
                     "silvero": silvero,
-                    "file_path": chunk_filename
+                    "timings": analysis["timings"],
+                    "errors": analysis["errors"]
                 }
 
                 logging.info(f"[Chunk {chunk_index}] {chunk_result}")
@@ -327,71 +455,87 @@ async def audio_ws(websocket: WebSocket):
         logging.warning(f"[WS] {username} forcibly disconnected.")
 
     finally:
-        await loop.run_in_executor(None, merge_chunks, chunk_results, final_output)
+        recorder.close()
 
         with open(transcript_path, "w", encoding="utf-8") as f:
             f.write(" ".join(text_output).strip())
 
         try:
-            essays_ref = db.collection("essays").where("username", "==", username)
-            essays = essays_ref.stream()
-            today = datetime.now().date()
-            latest_essay = max((doc for doc in essays if doc.create_time.date() == today), key=lambda d: d.create_time, default=None)
-
-            if latest_essay:
-                essay_ref = db.collection("essays").document(latest_essay.id)
+            if essay_id:
                 average_scores = topic.get_average_realtime_scores()
-                essay_ref.update({
+                await essays.update(essay_id, {
                     "chunks": chunk_results,
                     "average_scores": average_scores
                 })
-                logging.info(f"Updated essay {latest_essay.id}")
+                logging.info(f"Updated essay {essay_id}")
 
         except Exception as e:
             logging.error(f"[Firestore Update Error] {e}")
 
-        for file in os.listdir(user_dir):
-            if file.startswith("chunk_") and file.endswith(".wav"):
-                try:
-                    os.remove(os.path.join(user_dir, file))
-                except Exception as e:
-                    logging.warning(f"Failed to remove {file}: {e}")
 
 
-def merge_chunks(chunk_files, final_output):
-    logging.info("[Merge] Merging audio chunks...")
-    combined = AudioSegment.empty()
 
-    for chunk in chunk_files:
-        file_path = chunk.get("file_path")
-        if file_path and os.path.exists(file_path):
-            audio = AudioSegment.from_file(file_path, format="wav")
-            combined += audio
-        else:
-            logging.warning(f"[Merge] Skipping missing or invalid file: {file_path}")
-
-    combined.export(final_output, format="wav")
-    logging.info("[Merge] Merged audio file saved.")
 
 
+def tts_job_response(job, pending_status=202):
+    if job is None:
+        raise HTTPException(status_code=404, detail="TTS job not found")
+    if job["status"] == "done":
+        return FileResponse(job["path"], media_type="audio/wav", filename=os.path.basename(job["path"]))
+    if job["status"] == "failed":
+        raise HTTPException(status_code=500, detail=f"Audio generation failed: {job.get('error')}")
+    if pending_status == 408:
+        raise HTTPException(status_code=408, detail="Audio file not generated within 1 minute.")
+    return JSONResponse(status_code=pending_status, content={"job_id": job["id"], "status": job["status"]})
 
 
 @app.get("/get-tts-audio")
-def get_tts_audio(username: str):
-    folder = os.path.join("text_to_speech_audio_folder", username)
-    file_path = os.path.join(folder, f"{username}_output.wav")
+async def get_tts_audio(username: str = None, job_id: str = None):
+    """Essay audio by job id, or the user's latest job; waits up to a minute for it, then answers 408."""
+    if job_id is None:
+        if username is None:
+            raise HTTPException(status_code=400, detail="Pass job_id or username")
+        job_id = await tts_jobs.latest(username)
+        if job_id is None:
+            raise HTTPException(status_code=404, detail="No audio requested for this user")
+    return tts_job_response(await tts_jobs.wait(job_id, 60), pending_status=408)
+
+
+@app.get("/tts-jobs/{job_id}")
+async def tts_job_status(job_id: str):
+    job = await tts_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="TTS job not found")
+    return {key: job.get(key) for key in ("id", "status", "error", "created_at", "updated_at")}
+
 
-    timeout = 60
-    poll_interval = 2
-    waited = 0
+@app.get("/tts-jobs/{job_id}/audio")
+async def tts_job_audio(job_id: str, wait: float = Query(0, ge=0, le=60)):
+    """The job's audio, waiting up to `wait` seconds; 202 with the status while it is still pending."""
+    return tts_job_response(await tts_jobs.wait(job_id, wait))
 
-    while waited < timeout:
-        if os.path.exists(file_path):
-            return FileResponse(file_path, media_type="audio/wav", filename=f"{username}_output.wav")
-        time.sleep(poll_interval)
-        waited += poll_interval
 
-    raise HTTPException(status_code=408, detail="Audio file not generated within 1 minute.")
+@app.get("/tts-jobs/{job_id}/events")
+async def tts_job_events(job_id: str):
+    """Server-sent events with the job's status; the last one carries the audio URL."""
+    if await tts_jobs.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="TTS job not found")
+
+    async def events():
+        job = await tts_jobs.get(job_id)
+        while job is not None:
+            payload = {"job_id": job_id, "status": job["status"]}
+            if job["status"] == "done":
+                payload["audio_url"] = f"/tts-jobs/{job_id}/audio"
+            elif job["status"] == "failed":
+                payload["error"] = job.get("error")
+            yield f"event: {job['status']}\ndata: {json.dumps(payload)}\n\n"
+            if job["status"] in ("done", "failed"):
+                return
+            # Re-sent every 15 s while pending, which also keeps proxies from closing the stream.
+            job = await tts_jobs.wait(job_id, 15)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
 
 
 
@@ -437,10 +581,7 @@ if PINECONE_INDEX_NAME not in pc.list_indexes().names():
 
 index = pc.Index(PINECONE_INDEX_NAME)
 
-embedding_model = HuggingFaceEmbeddings(
-    model_name=EMBEDDING_MODEL_NAME,
-    model_kwargs={'device': 'cuda' if torch.cuda.is_available() else 'cpu'}
-)
+embedding_model = registry.get("e5_embeddings")
 
 executor = ThreadPoolExecutor(max_workers=8)
 
@@ -888,7 +1029,7 @@ async def chat(request: ChatRequest):
         """)
 
         qa_chain = RetrievalQA.from_chain_type(
-            llm=model_name,
+            llm=llm_gateway.llm(),
             chain_type="stuff",
             retriever=retriever,
             chain_type_kwargs={"prompt": prompt_template},
@@ -896,7 +1037,7 @@ async def chat(request: ChatRequest):
         )
 
         # Corrected: Pass the question directly instead of the chain
-        result = qa_chain.invoke({"query": question})  # Using invoke() instead of run()
+        result = await llm_gateway.ainvoke(qa_chain, {"query": question}, name="rag_chat")
 
         return {
             "question": question,
@@ -922,10 +1063,7 @@ def welcome_page():
 
 chat_history = []
 
-model = ChatOllama(
-            model="mistral", 
-            model_kwargs={"temperature": 0.8}
-        )
+model = llm_gateway.chat(temperature=0.8)
 
 async def system_message(topic, mood, student_class, level) -> SystemMessage:
     parser = StrOutputParser()
@@ -945,12 +1083,12 @@ async def system_message(topic, mood, student_class, level) -> SystemMessage:
     input_variables=["topic", "mood", "student_class", "level"])
 
     chain = prompt_template | model | parser
-    result = await chain.ainvoke({
+    result = await llm_gateway.ainvoke(chain, {
         "topic": topic,
         "mood": mood,
         "student_class": student_class,
         "level": level
-    })
+    }, name="assistant_intro")
     return result
 
 
@@ -988,9 +1126,7 @@ async def initialize_essay_document(username, student_topic, student_class, mood
             "average_scores": {}
         }
 
-        # For async Firestore client:
-        _, doc_ref = db.collection("essays").add(essay_data)
-        return doc_ref.id
+        return await essays.create(essay_data)
         
     except Exception as e:
         logging.error(f"Failed to initialize essay document: {str(e)}", exc_info=True)
@@ -1013,7 +1149,12 @@ async def audio_ws(websocket: WebSocket):
     mood = query_params.get("mood", [None])[0]
     accent = query_params.get("accent", [None])[0]
 
-    chat_history = []
+    if not await authenticate_ws(username, token):
+        await websocket.close(code=4001)
+        logging.info("Username or token missing or invalid.")
+        return
+
+    chat_history = ConversationMemory()
     essay_id = await initialize_essay_document(
         username=username,
         student_topic=student_topic,
@@ -1033,13 +1174,7 @@ async def audio_ws(websocket: WebSocket):
 
     ai_response = await system_message(student_topic, mood, student_class, accent)
 
-    chat_history.append(SystemMessage(content=ai_response))
-
-    
-    if not username or not token:
-        await websocket.close(code=4001)
-        logging.info("Username or token missing.")
-        return
+    chat_history.add(SystemMessage(content=ai_response))
 
     logging.info(f"[WS] Authenticated connection from {username}")
     
@@ -1056,32 +1191,43 @@ async def audio_ws(websocket: WebSocket):
         ],
         'max_repetitions': 2,
         'max_silence': 10.0,
-        'chunk_duration': 0.5
+        'chunk_duration': 0.5,
+        'barge_in_min_speech': 0.3
     }
 
     session_state = {
         'silvero_model':True,
-        'audio_buffer': AudioSegment.empty(),  # For accumulating speech chunks
+        'stream_audio': query_params.get("audio_stream", [None])[0] == "pcm",
+        'audio_buffer': PcmAccumulator(max_seconds=config['max_chunk_duration']),  # For accumulating speech chunks
         'text_buffer': [],  # For accumulating transcribed text
         'silence_duration': 0.0,
         'last_speech_time': time.time(),
         'conversation_active': False,
         'processing_active': False,  # To prevent overlap
+        'assistant_speaking_until': 0.0,  # Wall-clock time the current reply finishes playing
         'chunk_index': 0,
         'chunk_results': [],
         'text_output': []
     }
     topic = Topic()
+    vad_session = topic.vad_engine.session(min_silence=config['silence_threshold'])
+    if query_params.get("partial_transcripts", [None])[0] == "1":
+        # Transcribe while the user is still talking; see StreamingTranscriber
+        session_state['transcriber'] = StreamingTranscriber(
+            get_stt_backend(),
+            lambda partial: websocket.send_json({"action": "partial_transcript", **partial})
+        )
     session_temp_dir = tempfile.mkdtemp(prefix=f"{username}_", dir=TEMP_DIR)
 
     response_audio = await topic.text_to_speech_assistant(ai_response, username, session_temp_dir)
     sleep_time = await send_audio_response(websocket, response_audio)
-    asyncio.sleep(sleep_time)
+    session_state['assistant_speaking_until'] = time.time() + sleep_time
 
     logging.info(f"[Session] Temp dir created at {session_temp_dir}")
     
     final_output = os.path.join(session_temp_dir, f"{username}_output.wav")
     transcript_path = os.path.join(session_temp_dir, f"{username}_transcript.txt")
+    session_state['recorder'] = WavRecorder(final_output)
 
     try:
         
@@ -1099,39 +1245,56 @@ async def audio_ws(websocket: WebSocket):
                 current_time = time.time()
                 
                 # Add new audio to buffer
-                new_chunk = AudioSegment(
-                    data=message["bytes"],
-                    sample_width=2,
-                    frame_rate=16000,
-                    channels=1
-                )
-                session_state['audio_buffer'] += new_chunk
-                
-                # Save temp chunk for VAD
-                chunk_filename = os.path.join(session_temp_dir, f"chunk_temp_{session_state['chunk_index']}.wav")
-                new_chunk.export(chunk_filename, format="wav")
+                session_state['audio_buffer'].append(message["bytes"])
                 session_state['chunk_index'] += 1
-                
-                vad_result = await topic.silvero_vad(chunk_filename)
-                current_silence = vad_result.get("duration", 0.0)
-                
-                if current_silence > 0.3:
-                    session_state['silence_duration'] = min(
-                        session_state['silence_duration'] + current_silence,
-                        config['max_silence']
-                    )
-                    logging.info(f"[VAD] Silence detected: {current_silence:.2f}s (Total: {session_state['silence_duration']:.2f}s)")
-                    
-                    if session_state['silence_duration'] >= config['silence_threshold']:
 
-                        await process_buffered_audio(final_output,transcript_path,session_state, websocket, username, session_temp_dir, topic, config,student_topic,student_class,mood,accent,chat_history)
+                # VAD straight on the received PCM; state carries over between frames
+                vad_events = await asyncio.to_thread(vad_session.feed, message["bytes"])
+                for event in vad_events:
+                    logging.info(f"[VAD] {event['event']} at {event['time']:.2f}s")
+
+                if current_time < session_state['assistant_speaking_until']:
+                    if vad_session.triggered and vad_session.speech_duration >= config['barge_in_min_speech']:
+                        # User talks over the reply: stop playback and keep listening
+                        session_state['assistant_speaking_until'] = 0.0
+                        logging.info(f"[WS] {username} barged in")
+                        await websocket.send_json({"action": "barge_in"})
+                    elif not vad_session.triggered:
+                        # Only the assistant's own playback (or silence) so far
+                        session_state['audio_buffer'].reset()
+                        if session_state.get('transcriber'):
+                            session_state['transcriber'].reset()
+                        vad_session.reset()
+                    continue
+
+                if any(event["event"] == "speech_discarded" for event in vad_events) and session_state.get('transcriber'):
+                    session_state['transcriber'].reset()
+
+                utterance_over = any(event["event"] == "speech_end" for event in vad_events)
+                if not utterance_over and vad_session.last_speech is not None and session_state['audio_buffer'].full:
+                    # Cut overlong utterances at max_chunk_duration
+                    logging.info(f"[VAD] {username} hit max_chunk_duration, processing early")
+                    utterance_over = True
+                if not utterance_over and vad_session.triggered and session_state.get('transcriber'):
+                    session_state['transcriber'].update(session_state['audio_buffer'])
+
+                if utterance_over:
+                    vad_session.reset()
+                    await process_buffered_audio(final_output,transcript_path,session_state, websocket, username, session_temp_dir, topic, config,student_topic,student_class,mood,accent,chat_history)
+                elif not vad_session.triggered and vad_session.last_speech is None:
+                    # Nothing said yet: keep only the most recent stretch of leading silence
+                    session_state['audio_buffer'].keep_last(config['max_silence'])
 
     except WebSocketDisconnect:
         logging.warning(f"[WS] {username} disconnected unexpectedly")
     except Exception as e:
         logging.error(f"Unexpected error: {str(e)}", exc_info=True)
     finally:
-        essay_id = finalize_session(session_state, username, session_temp_dir, topic,essay_id,chat_history)
+        chat_history.close()
+        if session_state.get('transcriber'):
+            session_state['transcriber'].reset()
+        session_state['recorder'].close()
+        essay_id = await finalize_session(session_state, username, session_temp_dir, topic,essay_id,chat_history)
 
 
 
@@ -1144,11 +1307,14 @@ def cleanup_temp_files(session_temp_dir, chunk_results):
     try:
         # Remove individual chunk files
         for chunk in chunk_results:
+            file_path = chunk.get('file_path')
+            if not file_path:
+                continue
             try:
-                if os.path.exists(chunk['file_path']):
-                    os.remove(chunk['file_path'])
+                if os.path.exists(file_path):
+                    os.remove(file_path)
             except Exception as e:
-                logging.warning(f"Failed to delete chunk file {chunk['file_path']}: {e}")
+                logging.warning(f"Failed to delete chunk file {file_path}: {e}")
 
         # Remove the temporary directory if empty
         try:
@@ -1172,23 +1338,25 @@ async def process_buffered_audio(final_output,transcript_path,session_state, web
     try:
 
 
-        buffer_filename = os.path.join(temp_dir, f"buffered_{time.time()}.wav")
-        session_state['audio_buffer'].export(buffer_filename, format="wav")
+        utterance = session_state['audio_buffer'].to_buffer(name=f"buffered_{time.time()}.wav")
         
-        # Transcribe
-        transcribed_text = await topic.speech_to_text(buffer_filename, username)
+        # Transcribe and score concurrently, straight from memory
+        transcriber = session_state.get('transcriber')
+        if transcriber:
+            # Only the audio after the last committed partial still needs STT. Not cached:
+            # the result is stitched from pieces, not a full-utterance transcription.
+            transcribe = lambda: transcriber.finalize(session_state['audio_buffer'])
+        else:
+            transcribe = lambda: topic.speech_to_text(utterance, username)
+        analysis = await analyse_utterance(http_client, utterance, transcribe)
+        transcribed_text = analysis["text"]
         logging.info(f"Transcribed: {transcribed_text}")
         session_state['text_buffer'].append(transcribed_text)
         session_state['text_output'].append(transcribed_text)
         
-        # Save combined audio
-        final_output = os.path.join(temp_dir, f"{username}_output.wav")
-        if os.path.exists(final_output):
-            existing_audio = AudioSegment.from_wav(final_output)
-            combined_audio = existing_audio + session_state['audio_buffer']
-        else:
-            combined_audio = session_state['audio_buffer']
-        combined_audio.export(final_output, format="wav")
+        # Append to the session recording; nothing already written is re-read
+        session_state['recorder'].write(utterance.pcm)
+        session_state['recorder'].flush()
         
         # Save transcript
         transcript_path = os.path.join(temp_dir, f"{username}_transcript.txt")
@@ -1200,49 +1368,27 @@ async def process_buffered_audio(final_output,transcript_path,session_state, web
         if (len(transcribed_text.split()) >= config['min_utterance_length'] and 
             clean_text not in config['blocklist']):
             
-            # Get speech analysis
-            async with aiohttp.ClientSession() as session:
-
-                with open(buffer_filename, "rb") as f:
-                        form = aiohttp.FormData()
-                        form.add_field("file", f, filename=os.path.basename(buffer_filename), content_type="audio/wav")
-                        async with session.post(f"{CPU_API_BASE}/detect-emotion", data=form) as res:
-                            emotion_data = await res.json()
-                            emotion = emotion_data.get("emotion")
-
-                async with session.post(
-                    f"{CPU_API_BASE}/fluency-score",
-                    json={"text": transcribed_text}
-                ) as res:
-                    fluency_data = await res.json()
-                    fluency = fluency_data.get("fluency")
-
-                # Pronunciation
-                with open(buffer_filename, "rb") as f:
-                    form = aiohttp.FormData()
-                    form.add_field("file", f, filename=os.path.basename(buffer_filename), content_type="audio/wav")
-                    async with session.post(f"{CPU_API_BASE}/pronunciation-score", data=form) as res:
-                        pron_data = await res.json()
-                        pronunciation = pron_data.get("pronunciation")
-
-                result = {
-                    "fluency": fluency,
-                    "pronunciation": pronunciation,
-                    "emotion": emotion
-                }
+            result = {
+                "fluency": analysis["fluency"],
+                "pronunciation": analysis["pronunciation"],
+                "emotion": analysis["emotion"]
+            }
 
-                if None in result.values():
-                    logging.warning(f"Incomplete analysis results: {result}")
+            if None in result.values():
+                logging.warning(f"Incomplete analysis results: {result} errors: {analysis['errors']}")
 
-                logging.info(f"result is --------------->{result}")
+            logging.info(f"result is --------------->{result} timings: {analysis['timings']}")
 
-                await process_user_utterance(
-                    transcribed_text, result["emotion"], result["fluency"], result["pronunciation"],
-                    session_state, buffer_filename, websocket, 
-                    username, temp_dir, topic,student_topic,student_class,mood,accent,chat_history
-                )
+            await process_user_utterance(
+                transcribed_text, result["emotion"], result["fluency"], result["pronunciation"],
+                session_state, None, websocket, 
+                username, temp_dir, topic,student_topic,student_class,mood,accent,chat_history,
+                timings=analysis["timings"]
+            )
 
-        session_state['audio_buffer'] = AudioSegment.empty()
+        session_state['audio_buffer'].reset()
+        if session_state.get('transcriber'):
+            session_state['transcriber'].reset()
         session_state['text_buffer'] = []
         session_state['silence_duration'] = 0.0
         session_state['conversation_active'] = True
@@ -1257,31 +1403,65 @@ async def process_buffered_audio(final_output,transcript_path,session_state, web
 
 
 async def scraping(topic: str) -> str:
-    url = f"https://en.wikipedia.org/wiki/{topic}"
-    api_endpoint = f"https://api.scrapingdog.com/scrape?api_key={scraping_api_key}&url={url}"
+    return await topic_context.get(topic)
 
-    text = ""
-    try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(api_endpoint) as response:
-                if response.status == 200:
-                    html = await response.text()  # ✅ FIXED
-                    soup = BeautifulSoup(html, "html.parser")
-                    for tag in soup(["script", "style", "noscript"]):
-                        tag.decompose()
-                    text = soup.get_text(separator="\n", strip=True)
-                else:
-                    logging.warning(f"[SCRAPING] Failed with status {response.status}: {await response.text()}")
-    except Exception as e:
-        logging.exception(f"[SCRAPING ERROR] Failed to scrape data: {e}")
 
-    return text
 
+ASSISTANT_PROMPT = PromptTemplate(template = """
+    ROLE: You are a friendly, knowledgeable assistant and communicate like a friend. Your purpose is to:
+    1. Answer questions conversationally
+    2. Never reveal internal project details
+    3. Keep responses under 200 words
+    5. if by chance question is much more specific topic is needed and you does not have correct answer then used the function await scraping(your_specific_topic), which help in give updated answer.
+
+    Chat History:
+    {chat_history}
+    considering history as well before answering the question.
+
+    Topic: {student_topic}
+    Mood: {mood}
+    Student Class: {student_class}
+    Level: {level}
+
+    - for reply anything consider always the Topic, Mood , student_class, Level and history.
+    - And should be reply in the way and look like a friendly, knowledgeable teaching assistant.
+    - Do not mention any technical details, model architecture, or team members.
+    - Focus on providing helpful, concise answers.
+    - If the question is not related to the topic, politely tell that quesiton is not related to the toic                     
+
+
+    RULES:
+    - NEVER mention:
+    * Model architecture/type
+    * Team members/credentialsS
+    * Code implementation
+    * Technical specifications
+    - Always redirect technical questions to general knowledge                                                                                                 
+
+    USER QUESTION: {question}
+
+    RESPONSE FORMAT:
+    [Answer Concise 1-10 sentence response] 
+    [if needed  Optional follow-up question to continue conversation]
+
+    EXAMPLE:
+    This exaple is for you never asked that. 
+    User: What model are you using?
+    I focus on helping with learning concepts rather than technical details. 
+    Would you like me to explain how these systems generally work?
+
+    Current response should be:
+    """,input_variables=["question","student_topic","student_class","mood","accent","chat_history"]
+    )
+
+# Built once; the ChatOllama client behind it is shared through the gateway
+assistant_chain = ASSISTANT_PROMPT | llm_gateway.chat(temperature=0.8) | StrOutputParser()
 
 
 async def process_user_utterance(text, emotion, fluency, pronunciation, 
                                session_state, chunk_filename, websocket, 
-                               username, session_temp_dir, topic,student_topic,student_class,mood,accent,chat_history):
+                               username, session_temp_dir, topic,student_topic,student_class,mood,accent,chat_history,
+                               timings=None):
     topic.update_realtime_stats(fluency, pronunciation, emotion)
     """Process a valid user utterance"""
     session_state['text_output'].append(text)
@@ -1291,105 +1471,121 @@ async def process_user_utterance(text, emotion, fluency, pronunciation,
         "emotion": emotion,
         "fluency": fluency,
         "pronunciation": pronunciation,
+        "timings": timings,
         "file_path": chunk_filename
     })
     session_state['chunk_index'] += 1
 
     try:
-        
-        prompt_template = PromptTemplate(template = """
-            ROLE: You are a friendly, knowledgeable assistant and communicate like a friend. Your purpose is to:
-            1. Answer questions conversationally
-            2. Never reveal internal project details
-            3. Keep responses under 200 words
-            5. if by chance question is much more specific topic is needed and you does not have correct answer then used the function await scraping(your_specific_topic), which help in give updated answer.
-                                         
-            Chat History:
-            {chat_history}
-            considering history as well before answering the question.
-
-            Topic: {student_topic}
-            Mood: {mood}
-            Student Class: {student_class}
-            Level: {level}
-                                         
-            - for reply anything consider always the Topic, Mood , student_class, Level and history.
-            - And should be reply in the way and look like a friendly, knowledgeable teaching assistant.
-            - Do not mention any technical details, model architecture, or team members.
-            - Focus on providing helpful, concise answers.
-            - If the question is not related to the topic, politely tell that quesiton is not related to the toic                     
-                                                                
-
-            RULES:
-            - NEVER mention:
-            * Model architecture/type
-            * Team members/credentialsS
-            * Code implementation
-            * Technical specifications
-            - Always redirect technical questions to general knowledge                                                                                                 
-
-            USER QUESTION: {question}
-
-            RESPONSE FORMAT:
-            [Answer Concise 1-10 sentence response] 
-            [if needed  Optional follow-up question to continue conversation]
-
-            EXAMPLE:
-            This exaple is for you never asked that. 
-            User: What model are you using?
-            I focus on helping with learning concepts rather than technical details. 
-            Would you like me to explain how these systems generally work?
-
-            Current response should be:
-            """,input_variables=["question","student_topic","student_class","mood","accent","chat_history"]
-            )
-        
-        model = ChatOllama(
-                model="mistral",
-                model_kwargs={"temperature": 0.8}
-            )
-
-        
+        # Bound the prompt: oldest history goes first, then the question itself
+        budgeted = await PromptBudget("assistant").afit([
+            Section("chat_history", await chat_history.arender(), max_tokens=1200, priority=1, keep="tail"),
+            Section("question", text, max_tokens=300, priority=2, min_tokens=100),
+        ], fixed=ASSISTANT_PROMPT.template)
 
-        parser = StrOutputParser()
-
-        chain = prompt_template | model | parser
-
-        ai_response = await chain.ainvoke({
+        inputs = {
             "student_topic": student_topic,
             "mood": mood,
             "student_class": student_class,
             "level": accent,
-            "question": text,
-            "chat_history": chat_history
-        })
-        chat_history.append(AIMessage(content=ai_response))
+            **budgeted
+        }
+        if session_state.get('stream_audio'):
+            ai_response, sleep_time = await stream_assistant_reply(websocket, assistant_chain, inputs)
+        else:
+            ai_response = await llm_gateway.ainvoke(assistant_chain, inputs, name="assistant")
+        chat_history.add(HumanMessage(content=text))
+        chat_history.add(AIMessage(content=ai_response))
         print("[AI Response]:", ai_response)
 
-        chunk_result = {
-                    "chunk_index": session_state['chunk_index'],
-                    "text": text,
-                    "emotion": emotion,
-                    "fluency": fluency,
-                    "pronunciation": pronunciation,
-                    "file_path": chunk_filename,
-                    "chat_history":chat_history,
-                }
-        
-        session_state["chunk_results"].append(chunk_result)
-
-        response_audio = await topic.text_to_speech_assistant(ai_response, username, session_temp_dir)
-        sleep_time = await send_audio_response(websocket, response_audio)
-        time.sleep(sleep_time)
+        if not session_state.get('stream_audio'):
+            response_audio = await topic.text_to_speech_assistant(ai_response, username, session_temp_dir)
+            sleep_time = await send_audio_response(websocket, response_audio)
+        # Gate incoming audio while the reply plays instead of blocking the event loop
+        session_state['assistant_speaking_until'] = time.time() + sleep_time
+        # Fold turns older than the verbatim window into the summary while the reply plays
+        chat_history.compact()
         session_state["silvero_model"]=True
         print("session state now : ",session_state["silvero_model"])
 
     except Exception as e:
         logging.error(f"QA Error: {str(e)}")
-        await send_default_response(websocket, username, session_temp_dir, topic)
+        sleep_time = await send_default_response(websocket, username, session_temp_dir, topic)
+        session_state['assistant_speaking_until'] = time.time() + sleep_time
+
+
+
 
 
+async def stream_assistant_reply(websocket, chain, inputs):
+    """Stream a reply as it is generated: LLM tokens -> sentences -> TTS -> PCM frames.
+
+    Opt in with `audio_stream=pcm` on the /ws/assistant URL. Per reply the client receives:
+      {"action": "tts_stream_start", "reply_id", "sample_rate", "format": "pcm_s16le", "channels": 1}
+      then per sentence {"action": "tts_sentence", "reply_id", "index", "text"} followed by one
+      binary frame of raw PCM for that sentence,
+      and finally {"action": "tts_stream_end", "reply_id", "sentences", "audio_seconds", "time_to_first_audio"}.
+    Returns the full reply text and the seconds of audio still to be played.
+    """
+    reply_id = uuid.uuid4().hex
+    started = time.perf_counter()
+    splitter = SentenceSplitter()
+    sentences = asyncio.Queue()
+    state = {"first_audio": None, "first_audio_at": None, "audio_seconds": 0.0, "count": 0}
+
+    await websocket.send_json({
+        "action": "tts_stream_start",
+        "reply_id": reply_id,
+        "sample_rate": tts_engine.sample_rate,
+        "format": "pcm_s16le",
+        "channels": 1
+    })
+
+    async def speak():
+        # Synthesis of sentence N overlaps generation of sentence N+1.
+        while True:
+            sentence = await sentences.get()
+            if sentence is None:
+                return
+            samples = await asyncio.to_thread(tts_engine.synthesize, sentence)
+            if not len(samples) or websocket.client_state == WebSocketState.DISCONNECTED:
+                continue
+            await websocket.send_json({"action": "tts_sentence", "reply_id": reply_id, "index": state["count"], "text": sentence})
+            await websocket.send_bytes(encode_pcm16(samples))
+            if state["first_audio"] is None:
+                state["first_audio_at"] = time.perf_counter()
+                state["first_audio"] = state["first_audio_at"] - started
+                metrics.tracker("assistant.time_to_first_audio").observe(state["first_audio"])
+            state["audio_seconds"] += len(samples) / tts_engine.sample_rate
+            state["count"] += 1
+
+    speaker = asyncio.create_task(speak())
+    parts = []
+    try:
+        async for token in llm_gateway.astream(chain, inputs, name="assistant"):
+            parts.append(token)
+            for sentence in splitter.feed(token):
+                sentences.put_nowait(sentence)
+        tail = splitter.flush()
+        if tail:
+            sentences.put_nowait(tail)
+    finally:
+        sentences.put_nowait(None)
+        await speaker
+
+    await websocket.send_json({
+        "action": "tts_stream_end",
+        "reply_id": reply_id,
+        "sentences": state["count"],
+        "audio_seconds": round(state["audio_seconds"], 2),
+        "time_to_first_audio": round(state["first_audio"], 3) if state["first_audio"] is not None else None
+    })
+    logging.info(f"[TTS stream] {state['count']} sentences, first audio after {state['first_audio']}s")
 
+    if state["first_audio_at"] is None:
+        return "".join(parts), 0
+    remaining = state["audio_seconds"] - (time.perf_counter() - state["first_audio_at"])
+    return "".join(parts), max(remaining, 0)
 
 
 async def send_audio_response(websocket, audio_file):
@@ -1399,18 +1595,18 @@ async def send_audio_response(websocket, audio_file):
             logging.error(f"Audio file not found: {audio_file}")
             return 0  # Return default sleep time
             
-        audio = AudioSegment.from_wav(audio_file)
-        duration_ms = len(audio)
-        
         # Check if websocket is still connected
         if websocket.client_state == WebSocketState.DISCONNECTED:
             logging.warning("WebSocket disconnected before sending audio")
             return 0
             
         with open(audio_file, "rb") as f:
-            await websocket.send_bytes(f.read())
+            data = f.read()
+        await websocket.send_bytes(data)
 
-        return duration_ms / 1000
+        # Duration straight from the WAV header, no decode
+        with wave.open(io.BytesIO(data)) as wav:
+            return wav.getnframes() / wav.getframerate()
         
     except Exception as e:
         logging.error(f"Failed to send audio response: {str(e)}")
@@ -1426,9 +1622,10 @@ async def send_default_response(websocket, username, session_temp_dir, topic):
     try:
         default_response = "I didn't quite catch that. Could you please repeat?"
         response_audio = await topic.text_to_speech_assistant(default_response, username, session_temp_dir)
-        await send_audio_response(websocket, response_audio)
+        return await send_audio_response(websocket, response_audio)
     except Exception as e:
         logging.error(f"Failed to send default response: {str(e)}")
+        return 0
 
 async def send_followup(websocket, username, session_temp_dir, topic):
     """Send follow-up message after silence"""
@@ -1441,7 +1638,7 @@ async def send_followup(websocket, username, session_temp_dir, topic):
 
 
 
-def finalize_session(session_state, username, session_temp_dir, topic, essay_id, chat_history):
+async def finalize_session(session_state, username, session_temp_dir, topic, essay_id, chat_history):
     """Update the existing essay document with final data"""
     try:
         # Convert LangChain message objects to simple dictionaries
@@ -1472,13 +1669,11 @@ def finalize_session(session_state, username, session_temp_dir, topic, essay_id,
                 'emotion': chunk.get('emotion'),
                 'fluency': chunk.get('fluency'),
                 'pronunciation': chunk.get('pronunciation'),
+                'timings': chunk.get('timings'),
                 # Exclude file_path as it's temporary
             }
             chunk_results_clean.append(clean_chunk)
 
-        # Get Firestore document reference
-        essay_ref = db.collection("essays").document(essay_id)
-        
         # Prepare update data
         update_data = {
             "chat_history": serializable_chat_history,
@@ -1490,7 +1685,7 @@ def finalize_session(session_state, username, session_temp_dir, topic, essay_id,
         }
 
         # Update document
-        essay_ref.update(update_data)
+        await essays.update(essay_id, update_data)
         logging.info(f"Successfully updated essay document {essay_id}")
         
     except Exception as e:
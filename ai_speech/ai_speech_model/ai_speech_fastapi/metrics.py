@@ -0,0 +1,103 @@
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+class LatencyTracker:
+    """Rolling latency window with count, mean, p50/p99 and throughput."""
+
+    def __init__(self, window=2048):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total = 0.0
+        self.started = None
+
+    def observe(self, seconds: float):
+        with self._lock:
+            if self.started is None:
+                self.started = time.time()
+            self._samples.append(seconds)
+            self.count += 1
+            self.total += seconds
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def percentile(self, p: float) -> float:
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return 0.0
+        index = max(math.ceil(p / 100 * len(samples)) - 1, 0)
+        return samples[index]
+
+    def summary(self) -> dict:
+        elapsed = time.time() - self.started if self.started else 0.0
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count * 1000, 2) if self.count else 0.0,
+            "p50_ms": round(self.percentile(50) * 1000, 2),
+            "p99_ms": round(self.percentile(99) * 1000, 2),
+            "per_second": round(self.count / elapsed, 2) if elapsed > 0 else 0.0,
+        }
+
+
+class Counter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class Gauge:
+    def __init__(self):
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+
+_trackers = {}
+_counters = {}
+_gauges = {}
+_lock = threading.Lock()
+
+
+def tracker(name: str) -> LatencyTracker:
+    if name not in _trackers:
+        with _lock:
+            _trackers.setdefault(name, LatencyTracker())
+    return _trackers[name]
+
+
+def counter(name: str) -> Counter:
+    if name not in _counters:
+        with _lock:
+            _counters.setdefault(name, Counter())
+    return _counters[name]
+
+
+def gauge(name: str) -> Gauge:
+    if name not in _gauges:
+        with _lock:
+            _gauges.setdefault(name, Gauge())
+    return _gauges[name]
+
+
+def snapshot() -> dict:
+    return {
+        "latency": {name: t.summary() for name, t in sorted(_trackers.items())},
+        "counters": {name: c.value for name, c in sorted(_counters.items())},
+        "gauges": {name: g.value for name, g in sorted(_gauges.items())},
+    }
@@ -0,0 +1,186 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+
+logger = logging.getLogger("essay")
+
+SILERO_VAD_PATH = "silero_vad/silero-vad/src/silero_vad/data/silero_vad.jit"
+GRAMMAR_MODEL_ID = "textattack/roberta-base-CoLA"
+EMBEDDING_MODEL_NAME = "embaas/sentence-transformers-e5-large-v2"
+LOCAL_WHISPER_MODEL = os.getenv("LOCAL_WHISPER_MODEL", "openai/whisper-small.en")
+# Dynamic int8 quantization of the Linear layers; CPU only.
+LOCAL_WHISPER_INT8 = os.getenv("LOCAL_WHISPER_INT8", "1") == "1"
+
+
+def _rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except Exception:
+        return 0
+
+
+def _module_bytes(obj) -> int:
+    """Parameter + buffer bytes of every torch module reachable from a loaded model object."""
+    try:
+        import torch
+    except ImportError:
+        return 0
+
+    seen = set()
+    total = 0
+    candidates = list(obj) if isinstance(obj, (tuple, list)) else [obj]
+    for candidate in candidates:
+        for inner in (candidate, getattr(candidate, "model", None), getattr(candidate, "client", None)):
+            if not isinstance(inner, torch.nn.Module) or id(inner) in seen:
+                continue
+            seen.add(id(inner))
+            for tensor in list(inner.parameters()) + list(inner.buffers()):
+                total += tensor.numel() * tensor.element_size()
+    return total
+
+
+class ModelRegistry:
+    """Loads each model once per process and hands the same instance to every caller.
+
+    Models are loaded lazily on first `get` (or eagerly via `warmup`). Loading
+    happens under a per-model lock so concurrent first users wait for one load
+    instead of racing. Instances are shared read-only; models that keep
+    mutable state between calls should be used under `lock(name)`.
+    """
+
+    def __init__(self):
+        self._loaders = {}
+        self._models = {}
+        self._stats = {}
+        self._load_locks = {}
+        self._use_locks = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, loader):
+        with self._lock:
+            self._loaders[name] = loader
+            self._load_locks[name] = threading.Lock()
+            self._use_locks[name] = threading.RLock()
+
+    def get(self, name):
+        model = self._models.get(name)
+        if model is not None:
+            return model
+
+        if name not in self._loaders:
+            raise KeyError(f"Unknown model '{name}'")
+
+        with self._load_locks[name]:
+            model = self._models.get(name)
+            if model is not None:
+                return model
+
+            rss_before = _rss_bytes()
+            start = time.perf_counter()
+            model = self._loaders[name]()
+            elapsed = time.perf_counter() - start
+
+            memory = _module_bytes(model) or max(_rss_bytes() - rss_before, 0)
+            self._stats[name] = {
+                "load_seconds": round(elapsed, 3),
+                "memory_mb": round(memory / (1024 * 1024), 1),
+                "loaded_at": datetime.now().isoformat(),
+            }
+            logger.info(f"[Models] Loaded '{name}' in {elapsed:.2f}s ({self._stats[name]['memory_mb']} MB)")
+            self._models[name] = model
+            return model
+
+    def lock(self, name):
+        """Lock serializing use of a model that is not safe to call concurrently."""
+        return self._use_locks[name]
+
+    def is_loaded(self, name) -> bool:
+        return name in self._models
+
+    def warmup(self, names):
+        for name in names:
+            try:
+                self.get(name)
+            except Exception as e:
+                logger.error(f"[Models] Failed to warm up '{name}': {e}")
+
+    def stats(self) -> dict:
+        return {
+            name: {"loaded": name in self._models, **self._stats.get(name, {})}
+            for name in self._loaders
+        }
+
+
+def _load_silero_vad():
+    import torch
+
+    model = torch.jit.load(SILERO_VAD_PATH)
+    model.eval()
+    return model
+
+
+def _load_vad_engine():
+    from vad_engine import SileroVadEngine
+
+    return SileroVadEngine(registry.get("silero_vad"))
+
+
+def _load_grammar_model():
+    import torch
+    from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    tokenizer = AutoTokenizer.from_pretrained(GRAMMAR_MODEL_ID)
+    model = AutoModelForSequenceClassification.from_pretrained(GRAMMAR_MODEL_ID, use_safetensors=True).to(device)
+    model.eval()
+    return tokenizer, model, device
+
+
+def _load_kokoro():
+    from kokoro import KPipeline
+
+    return KPipeline(lang_code='a')
+
+
+def _load_embeddings():
+    import torch
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    return HuggingFaceEmbeddings(
+        model_name=EMBEDDING_MODEL_NAME,
+        model_kwargs={'device': 'cuda' if torch.cuda.is_available() else 'cpu'}
+    )
+
+
+def _load_whisper_local():
+    import torch
+    from transformers import AutoProcessor, WhisperForConditionalGeneration
+
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    processor = AutoProcessor.from_pretrained(LOCAL_WHISPER_MODEL)
+    model = WhisperForConditionalGeneration.from_pretrained(LOCAL_WHISPER_MODEL)
+    model.eval()
+    if device == "cpu" and LOCAL_WHISPER_INT8:
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return processor, model.to(device), device
+
+
+def _load_mistral():
+    from llm_gateway import llm_gateway
+
+    # The gateway owns the client; registering it here keeps it in /health/models.
+    return llm_gateway.llm()
+
+
+registry = ModelRegistry()
+registry.register("silero_vad", _load_silero_vad)
+registry.register("vad_engine", _load_vad_engine)
+registry.register("cola_grammar", _load_grammar_model)
+registry.register("kokoro", _load_kokoro)
+registry.register("e5_embeddings", _load_embeddings)
+registry.register("whisper_local", _load_whisper_local)
+registry.register("mistral", _load_mistral)
@@ -0,0 +1,199 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+import metrics
+
+
+logger = logging.getLogger("essay")
+
+LLM_TOKENIZER = os.getenv("LLM_TOKENIZER", "mistralai/Mistral-7B-Instruct-v0.3")
+# Ollama's context window for mistral, and the part of it kept free for the reply.
+LLM_CONTEXT_TOKENS = int(os.getenv("LLM_CONTEXT_TOKENS", 4096))
+LLM_COMPLETION_TOKENS = int(os.getenv("LLM_COMPLETION_TOKENS", 512))
+
+
+class TokenCounter:
+    """Counts and truncates text in the LLM's own tokens.
+
+    The Hugging Face tokenizer for `LLM_TOKENIZER` is loaded by `load`, run
+    in a thread at startup (or on first use otherwise). If it cannot be
+    loaded (offline, gated repo), the counter falls back for good to an
+    estimate of 4/3 tokens per word and truncates on word boundaries.
+    Loading and tokenizing both block, so async code goes through
+    `PromptBudget.afit` and `ConversationMemory.arender`.
+    """
+
+    def __init__(self, model_id=LLM_TOKENIZER):
+        self.model_id = model_id
+        self._tokenizer = None
+        self._failed = False
+        self._lock = threading.Lock()
+
+    def load(self):
+        if self._tokenizer is not None or self._failed:
+            return self._tokenizer
+        with self._lock:
+            if self._tokenizer is None and not self._failed:
+                try:
+                    from transformers import AutoTokenizer
+
+                    self._tokenizer = AutoTokenizer.from_pretrained(self.model_id)
+                except Exception as e:
+                    self._failed = True
+                    logger.warning(f"[Prompt] Tokenizer '{self.model_id}' unavailable, estimating tokens: {e}")
+        return self._tokenizer
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        tokenizer = self.load()
+        if tokenizer is None:
+            return (len(text.split()) * 4 + 2) // 3
+        return len(tokenizer.encode(text, add_special_tokens=False))
+
+    def truncate(self, text: str, max_tokens: int, keep="head") -> str:
+        """At most `max_tokens` of `text`, keeping its start ("head") or its end ("tail")."""
+        if max_tokens <= 0 or not text:
+            return ""
+        tokenizer = self.load()
+        if tokenizer is None:
+            words = text.split()
+            limit = max_tokens * 3 // 4
+            if len(words) <= limit:
+                return text
+            return " ".join(words[:limit] if keep == "head" else words[-limit:])
+        ids = tokenizer.encode(text, add_special_tokens=False)
+        if len(ids) <= max_tokens:
+            return text
+        ids = ids[:max_tokens] if keep == "head" else ids[-max_tokens:]
+        return tokenizer.decode(ids, skip_special_tokens=True).strip()
+
+
+token_counter = TokenCounter()
+
+
+class Section:
+    """One variable part of a prompt.
+
+    `max_tokens` caps the section on its own. When the whole prompt is still
+    over budget, sections are cut further in ascending `priority`: the
+    lowest priority is trimmed first, but never below `min_tokens`.
+    """
+
+    def __init__(self, name, text, max_tokens, priority=1, min_tokens=0, keep="head"):
+        self.name = name
+        self.text = text or ""
+        self.max_tokens = max_tokens
+        self.priority = priority
+        self.min_tokens = min_tokens
+        self.keep = keep
+
+
+class PromptBudget:
+    """Fits prompt sections into the model's context window.
+
+    `fixed` is the template text that is always sent (instructions and
+    labels). What remains of `total` after it goes to the sections, first
+    capped per section and then reduced in priority order.
+    """
+
+    def __init__(self, name, total=LLM_CONTEXT_TOKENS - LLM_COMPLETION_TOKENS, counter=token_counter):
+        self.name = name
+        self.total = total
+        self.counter = counter
+
+    def fit(self, sections, fixed="") -> dict:
+        fixed_tokens = self.counter.count(fixed)
+        texts = {}
+        tokens = {}
+        for section in sections:
+            texts[section.name] = self.counter.truncate(section.text, section.max_tokens, section.keep)
+            tokens[section.name] = self.counter.count(texts[section.name])
+
+        over = fixed_tokens + sum(tokens.values()) - self.total
+        for section in sorted(sections, key=lambda s: s.priority):
+            if over <= 0:
+                break
+            target = max(tokens[section.name] - over, section.min_tokens)
+            if target >= tokens[section.name]:
+                continue
+            texts[section.name] = self.counter.truncate(texts[section.name], target, section.keep)
+            cut = tokens[section.name] - self.counter.count(texts[section.name])
+            tokens[section.name] -= cut
+            over -= cut
+
+        prompt_tokens = fixed_tokens + sum(tokens.values())
+        metrics.tracker(f"llm.{self.name}.prompt_tokens").observe(prompt_tokens)
+        logger.info(f"[Prompt] {self.name}: {prompt_tokens} tokens (fixed {fixed_tokens}, sections {tokens})")
+        return texts
+
+    async def afit(self, sections, fixed="") -> dict:
+        """`fit` in a worker thread, keeping tokenization off the event loop."""
+        return await asyncio.to_thread(self.fit, sections, fixed)
+
+
+class LlmUsage(BaseCallbackHandler):
+    """LangChain callback logging token counts and latency of every LLM call.
+
+    Ollama reports prompt_eval_count / eval_count and their durations in
+    nanoseconds; prefill is prompt evaluation, decode is generation. Attach
+    with `config={"callbacks": [LlmUsage("name")]}`.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._started = {}
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._started[run_id] = time.perf_counter()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        elapsed = time.perf_counter() - self._started.pop(run_id, time.perf_counter())
+        info = {}
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                info.update(generation.generation_info or {})
+                info.update(getattr(message, "response_metadata", None) or {})
+        record_usage(self.name, info, elapsed)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._started.pop(run_id, None)
+        metrics.counter(f"llm.{self.name}.errors").inc()
+
+
+def record_usage(name, info: dict, elapsed: float):
+    prompt_tokens = info.get("prompt_eval_count")
+    completion_tokens = info.get("eval_count")
+    prefill = info.get("prompt_eval_duration", 0) / 1e9
+    decode = info.get("eval_duration", 0) / 1e9
+
+    metrics.tracker(f"llm.{name}").observe(elapsed)
+    if prompt_tokens is not None:
+        metrics.counter("llm.prompt_tokens").inc(prompt_tokens)
+        metrics.tracker(f"llm.{name}.prefill").observe(prefill)
+    if completion_tokens is not None:
+        metrics.counter("llm.completion_tokens").inc(completion_tokens)
+        metrics.tracker(f"llm.{name}.decode").observe(decode)
+    logger.info(
+        f"[LLM] {name}: prompt {prompt_tokens} tok, completion {completion_tokens} tok, "
+        f"prefill {prefill:.2f}s, decode {decode:.2f}s, total {elapsed:.2f}s"
+    )
+
+
+def render_messages(messages) -> str:
+    """LangChain messages as "Role: content" lines, oldest first."""
+    roles = {"human": "Student", "ai": "Assistant", "system": "Assistant"}
+    lines = []
+    for message in messages:
+        role = roles.get(getattr(message, "type", ""), "Assistant")
+        lines.append(f"{role}: {getattr(message, 'content', message)}")
+    return "\n".join(lines)
@@ -0,0 +1,110 @@
+import logging
+import os
+import struct
+
+import numpy as np
+
+from audio_buffer import wav_header
+
+
+logger = logging.getLogger("essay")
+
+# "flac", "opus" or empty for WAV only.
+RECORDING_ARCHIVE = os.getenv("RECORDING_ARCHIVE", "").lower()
+
+ARCHIVE_FORMATS = {
+    "flac": ("flac", "FLAC", "PCM_16"),
+    "opus": ("ogg", "OGG", "OPUS"),
+}
+
+
+class WavRecorder:
+    """Append-only session recording.
+
+    The WAV file is opened once with a placeholder header; each utterance's
+    PCM is appended as it arrives and the RIFF/data sizes are patched in
+    place on `flush`. Nothing already written is ever read back, so a
+    session costs O(total audio) I/O and `close` is O(1). With
+    `archive_format` set, the same samples are also encoded to a compressed
+    stream next to the WAV.
+    """
+
+    def __init__(self, path, sample_rate=16000, channels=1, sample_width=2,
+                 archive_format=RECORDING_ARCHIVE, flush_bytes=1 << 20):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.sample_width = sample_width
+        self.flush_bytes = flush_bytes
+        self.data_bytes = 0
+        self._unflushed = 0
+        self._file = open(path, "wb")
+        self._file.write(wav_header(0, sample_rate, channels, sample_width))
+        self._archive = None
+        self.archive_path = None
+        if archive_format:
+            self._open_archive(archive_format)
+
+    def _open_archive(self, archive_format):
+        if archive_format not in ARCHIVE_FORMATS:
+            logger.warning(f"[Recording] Unknown archive format '{archive_format}', writing WAV only")
+            return
+        import soundfile as sf
+
+        ext, fmt, subtype = ARCHIVE_FORMATS[archive_format]
+        self.archive_path = f"{os.path.splitext(self.path)[0]}.{ext}"
+        try:
+            self._archive = sf.SoundFile(
+                self.archive_path, "w", samplerate=self.sample_rate,
+                channels=self.channels, format=fmt, subtype=subtype,
+            )
+        except Exception as e:
+            # Older libsndfile builds have no Opus encoder.
+            logger.warning(f"[Recording] {archive_format} archive unavailable: {e}")
+            self.archive_path = None
+
+    @property
+    def duration(self) -> float:
+        return self.data_bytes / (self.sample_rate * self.channels * self.sample_width)
+
+    @property
+    def closed(self) -> bool:
+        return self._file.closed
+
+    def write(self, pcm):
+        """Append raw int16 PCM (bytes, bytearray or memoryview)."""
+        self._file.write(pcm)
+        size = memoryview(pcm).nbytes
+        self.data_bytes += size
+        self._unflushed += size
+        if self._archive is not None:
+            samples = np.frombuffer(pcm, dtype=np.int16).reshape(-1, self.channels)
+            self._archive.write(samples)
+        if self._unflushed >= self.flush_bytes:
+            self.flush()
+
+    def flush(self):
+        """Patch the header sizes so the file on disk is a complete WAV."""
+        f = self._file
+        f.seek(4)
+        f.write(struct.pack("<I", 36 + self.data_bytes))
+        f.seek(40)
+        f.write(struct.pack("<I", self.data_bytes))
+        f.seek(0, os.SEEK_END)
+        f.flush()
+        self._unflushed = 0
+
+    def close(self):
+        if self.closed:
+            return
+        self.flush()
+        self._file.close()
+        if self._archive is not None:
+            self._archive.close()
+        logger.info(f"[Recording] Saved {self.duration:.1f}s to {self.path}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,165 @@
+import logging
+import os
+from contextlib import contextmanager
+from urllib.parse import quote
+
+import metrics
+from firestore_models import FirestoreEssay, FirestoreUser
+
+
+logger = logging.getLogger("essay")
+
+FIREBASE_KEY_PATH = os.getenv("FIREBASE_KEY_PATH", "firebase_key.json")
+# When set (e.g. "localhost:8080"), every call goes to the Firestore emulator instead of the real project.
+FIRESTORE_EMULATOR_HOST = os.getenv("FIRESTORE_EMULATOR_HOST")
+FIRESTORE_PROJECT_ID = os.getenv("FIRESTORE_PROJECT_ID", "demo-speaker")
+
+
+def create_async_client():
+    """firestore.AsyncClient for the configured project, or for the emulator in test mode."""
+    if FIRESTORE_EMULATOR_HOST:
+        from google.cloud import firestore
+
+        # The client picks up FIRESTORE_EMULATOR_HOST itself and needs no credentials.
+        logger.info(f"[Firestore] Using emulator at {FIRESTORE_EMULATOR_HOST} (project {FIRESTORE_PROJECT_ID})")
+        return firestore.AsyncClient(project=FIRESTORE_PROJECT_ID)
+
+    import firebase_admin
+    from firebase_admin import credentials, firestore_async
+
+    if not firebase_admin._apps:
+        firebase_admin.initialize_app(credentials.Certificate(FIREBASE_KEY_PATH))
+    return firestore_async.client()
+
+
+class UsernameTaken(Exception):
+    pass
+
+
+class Repository:
+    """Base for the Firestore collections, all on one shared AsyncClient.
+
+    The client is created on first use, inside the running event loop. Every
+    call is timed under firestore.<collection>.<operation>, and failures are
+    counted under the same name with an .errors suffix.
+    """
+
+    collection_name = None
+    _client = None
+
+    @classmethod
+    def client(cls):
+        if Repository._client is None:
+            Repository._client = create_async_client()
+        return Repository._client
+
+    @property
+    def collection(self):
+        return self.client().collection(self.collection_name)
+
+    @contextmanager
+    def _op(self, operation):
+        name = f"firestore.{self.collection_name}.{operation}"
+        try:
+            with metrics.tracker(name).time():
+                yield
+        except UsernameTaken:
+            raise
+        except Exception:
+            metrics.counter(f"{name}.errors").inc()
+            raise
+
+
+class UserRepository(Repository):
+    """Users, plus a usernames/{username} index holding each user's id.
+
+    The index makes username lookups a single document get, and creating
+    it in the same transaction as the user makes usernames unique.
+    """
+
+    collection_name = "users"
+    index_name = "usernames"
+
+    def _index_ref(self, username: str):
+        # Document ids cannot contain "/", so usernames are percent-encoded.
+        return self.client().collection(self.index_name).document(quote(username, safe=""))
+
+    async def get(self, user_id: str):
+        with self._op("get"):
+            doc = await self.collection.document(user_id).get()
+        return FirestoreUser.from_dict(doc.id, doc.to_dict()) if doc.exists else None
+
+    async def find_by_username(self, username: str):
+        with self._op("find_by_username"):
+            entry = await self._index_ref(username).get()
+        if entry.exists:
+            return await self.get(entry.to_dict()["user_id"])
+        return await self._index_existing(username)
+
+    async def _index_existing(self, username: str):
+        """Look up a user registered before the index existed, and index them."""
+        with self._op("find_by_username_query"):
+            docs = await self.collection.where("username", "==", username).limit(1).get()
+        if not docs:
+            return None
+        with self._op("index_username"):
+            await self._index_ref(username).set({"user_id": docs[0].id})
+        return FirestoreUser.from_dict(docs[0].id, docs[0].to_dict())
+
+    async def create(self, user: FirestoreUser) -> str:
+        """Add the user and claim their username atomically; raises UsernameTaken."""
+        from google.cloud.firestore import async_transactional
+
+        user_ref = self.collection.document()
+        index_ref = self._index_ref(user.username)
+
+        @async_transactional
+        async def claim(transaction):
+            entry = await index_ref.get(transaction=transaction)
+            if entry.exists:
+                raise UsernameTaken(user.username)
+            transaction.create(index_ref, {"user_id": user_ref.id})
+            transaction.set(user_ref, user.to_dict())
+
+        with self._op("create"):
+            await claim(self.client().transaction())
+        return user_ref.id
+
+
+class EssayRepository(Repository):
+    collection_name = "essays"
+
+    async def get(self, essay_id: str):
+        with self._op("get"):
+            doc = await self.collection.document(essay_id).get()
+        return FirestoreEssay.from_dict(doc.id, doc.to_dict()) if doc.exists else None
+
+    async def create(self, data) -> str:
+        """Add an essay, given as a FirestoreEssay or a plain dict of fields."""
+        if isinstance(data, FirestoreEssay):
+            data = data.to_dict()
+        with self._op("create"):
+            _, doc_ref = await self.collection.add(data)
+        return doc_ref.id
+
+    async def update(self, essay_id: str, fields: dict):
+        with self._op("update"):
+            await self.collection.document(essay_id).update(fields)
+
+    async def latest_for_user(self, username: str):
+        """The user's most recently created essay, if any.
+
+        Served by the composite index on (username, created_at descending).
+        """
+        with self._op("latest_for_user"):
+            docs = await (
+                self.collection.where("username", "==", username)
+                .order_by("created_at", direction="DESCENDING")
+                .limit(1)
+                .get()
+            )
+        return FirestoreEssay.from_dict(docs[0].id, docs[0].to_dict()) if docs else None
+
+
+users = UserRepository()
+essays = EssayRepository()
@@ -0,0 +1,119 @@
+import asyncio
+import hashlib
+import logging
+import os
+import time
+
+import metrics
+from ttl_cache import TTLCache
+
+
+logger = logging.getLogger("essay")
+
+# Revoked tokens kept in memory per worker; past this the check falls back to Redis.
+REVOCATION_LOCAL_MAX = int(os.getenv("REVOCATION_LOCAL_MAX", 100000))
+
+
+class RevocationStore:
+    """Revoked access tokens, shared by every worker through Redis.
+
+    Each revoked token is stored as `<prefix>:<sha256 of token>` with a TTL
+    ending at the token's own `exp`, after which it would be rejected
+    anyway, so the store never outgrows the tokens still in circulation.
+    Every worker mirrors the full set in a local TTL cache: it is loaded
+    from Redis at startup and kept current through pub/sub, so checking a
+    token that is not revoked needs no network. While the mirror is not
+    known to be complete (before the first load, after a lost
+    subscription, or once it is full), checks go to Redis instead.
+    """
+
+    def __init__(self, prefix="revoked", channel="revocation:revoked", maxsize=REVOCATION_LOCAL_MAX):
+        self.prefix = prefix
+        self.channel = channel
+        self.maxsize = maxsize
+        # Per-entry TTLs are set from each token's exp; the default is never used.
+        self.local = TTLCache(maxsize=maxsize, ttl=3600)
+        self.redis = None
+        self._synced = False
+        self._listener = None
+
+    def configure(self, redis_client):
+        """`redis_client` is a redis.asyncio client with decode_responses=True."""
+        self.redis = redis_client
+
+    async def start(self):
+        if self.redis is not None and self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def close(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+            self._listener = None
+        self._synced = False
+
+    @staticmethod
+    def _digest(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def _remember(self, digest, ttl):
+        if ttl <= 0:
+            return
+        if len(self.local) >= self.maxsize and self._synced:
+            logger.warning(f"[Revocation] Local mirror full ({self.maxsize}), checking Redis from now on")
+            self._synced = False
+        self.local.set(digest, True, ttl=ttl)
+        metrics.gauge("revocation.local_size").set(len(self.local))
+
+    async def revoke(self, token: str, exp: float):
+        """Reject `token` everywhere until `exp` (a Unix timestamp)."""
+        ttl = int(exp - time.time()) + 1
+        if ttl <= 0:
+            return
+        digest = self._digest(token)
+        self._remember(digest, ttl)
+        if self.redis is not None:
+            await self.redis.set(f"{self.prefix}:{digest}", 1, ex=ttl)
+            await self.redis.publish(self.channel, f"{digest}:{ttl}")
+        metrics.counter("revocation.revoked").inc()
+
+    async def is_revoked(self, token: str) -> bool:
+        digest = self._digest(token)
+        if self.local.get(digest):
+            metrics.counter("revocation.checks.local").inc()
+            return True
+        if self._synced or self.redis is None:
+            metrics.counter("revocation.checks.local").inc()
+            return False
+        metrics.counter("revocation.checks.redis").inc()
+        return bool(await self.redis.exists(f"{self.prefix}:{digest}"))
+
+    async def _load(self):
+        count = 0
+        async for key in self.redis.scan_iter(match=f"{self.prefix}:*", count=1000):
+            ttl = await self.redis.ttl(key)
+            self._remember(key.split(":", 1)[1], ttl)
+            count += 1
+        logger.info(f"[Revocation] Loaded {count} revoked tokens")
+
+    async def _listen(self):
+        while True:
+            try:
+                pubsub = self.redis.pubsub()
+                await pubsub.subscribe(self.channel)
+                # Subscribed before loading, so nothing revoked in between is missed.
+                await self._load()
+                self._synced = len(self.local) < self.maxsize
+                async for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        digest, ttl = message["data"].rsplit(":", 1)
+                        self._remember(digest, int(ttl))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._synced = False
+                logger.warning(f"[Revocation] Sync with Redis lost, retrying: {e}")
+                await asyncio.sleep(1)
+
+
+revocation_store = RevocationStore()
@@ -0,0 +1,141 @@
+import asyncio
+import json
+import logging
+import os
+
+import metrics
+from ttl_cache import TTLCache
+
+
+logger = logging.getLogger("essay")
+
+# How long a worker may serve a session or profile from memory without asking Redis.
+SESSION_LOCAL_TTL = float(os.getenv("SESSION_LOCAL_TTL", 30))
+PROFILE_TTL = int(os.getenv("PROFILE_TTL", 3600))
+
+
+class SessionCache:
+    """Login sessions and user profiles, cached in-process in front of Redis.
+
+    Redis holds the sessions (`session:<token>`) and a copy of each profile
+    (`profile:<user_id>`); the local TTL/LRU serves repeat lookups without a
+    round trip. Deleting or changing a session or profile publishes its key
+    on `channel`, and every worker drops its local copy on receipt, so a
+    logout takes effect everywhere at once. `local_ttl` bounds how stale a
+    copy can be if a message is ever missed. Missing sessions are never
+    cached locally, so a login on one worker is visible on all of them.
+    """
+
+    def __init__(self, maxsize=10000, local_ttl=SESSION_LOCAL_TTL, profile_ttl=PROFILE_TTL, channel="session_cache:invalidate"):
+        self.local = TTLCache(maxsize=maxsize, ttl=local_ttl)
+        self.profile_ttl = profile_ttl
+        self.channel = channel
+        self.redis = None
+        self._listener = None
+        self._invalidations = 0
+
+    def configure(self, redis_client):
+        """`redis_client` is a redis.asyncio client with decode_responses=True."""
+        self.redis = redis_client
+
+    async def start(self):
+        if self.redis is not None and self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def close(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+            self._listener = None
+
+    def _record(self, kind, outcome):
+        metrics.counter(f"session_cache.{kind}.{outcome}").inc()
+        hits = sum(metrics.counter(f"session_cache.{kind}.{o}").value for o in ("hit_local", "hit_redis"))
+        total = hits + metrics.counter(f"session_cache.{kind}.miss").value
+        metrics.gauge(f"session_cache.{kind}.hit_rate").set(round(hits / total, 3))
+        metrics.gauge("session_cache.local_size").set(len(self.local))
+
+    async def _get(self, kind, key):
+        value = self.local.get(key)
+        if value is not None:
+            self._record(kind, "hit_local")
+            return value
+        seen = self._invalidations
+        raw = await self.redis.get(key)
+        if raw is None:
+            self._record(kind, "miss")
+            return None
+        value = json.loads(raw)
+        if seen == self._invalidations:
+            # Otherwise an invalidation raced the read and the value may already be stale.
+            self.local.set(key, value)
+        self._record(kind, "hit_redis")
+        return value
+
+    async def _invalidate(self, key):
+        self._invalidations += 1
+        self.local.delete(key)
+        await self.redis.publish(self.channel, key)
+
+    async def _listen(self):
+        while True:
+            try:
+                pubsub = self.redis.pubsub()
+                await pubsub.subscribe(self.channel)
+                # Anything published while we were not subscribed is lost.
+                self.local.clear()
+                async for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        self._invalidations += 1
+                        self.local.delete(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"[Sessions] Invalidation channel lost, resubscribing: {e}")
+                await asyncio.sleep(1)
+
+    # ---------------- sessions ----------------
+    async def get_session(self, token: str):
+        return await self._get("session", f"session:{token}")
+
+    async def set_session(self, token: str, data: dict, ttl: int):
+        key = f"session:{token}"
+        await self.redis.setex(key, ttl, json.dumps(data))
+        self.local.set(key, data)
+
+    async def update_session(self, token: str, **fields):
+        """Merge `fields` into an existing session, keeping its expiry."""
+        key = f"session:{token}"
+        raw = await self.redis.get(key)
+        if raw is None:
+            return
+        data = {**json.loads(raw), **fields}
+        await self.redis.set(key, json.dumps(data), keepttl=True)
+        await self._invalidate(key)
+        self.local.set(key, data)
+
+    async def delete_session(self, token: str):
+        key = f"session:{token}"
+        await self.redis.delete(key)
+        await self._invalidate(key)
+
+    # ---------------- profiles ----------------
+    async def get_profile(self, user_id: str, load):
+        """Profile dict for `user_id`, from cache or `await load(user_id)` (None if no such user)."""
+        key = f"profile:{user_id}"
+        profile = await self._get("profile", key)
+        if profile is None:
+            profile = await load(user_id)
+            if profile is not None:
+                await self.redis.setex(key, self.profile_ttl, json.dumps(profile))
+                self.local.set(key, profile)
+        return profile
+
+    async def invalidate_profile(self, user_id: str):
+        """Call after changing a user's stored profile."""
+        key = f"profile:{user_id}"
+        await self.redis.delete(key)
+        await self._invalidate(key)
+
+
+session_cache = SessionCache()
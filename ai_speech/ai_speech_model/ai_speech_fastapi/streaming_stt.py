@@ -0,0 +1,151 @@
+import asyncio
+import logging
+import re
+import time
+
+import numpy as np
+
+import metrics
+from audio_buffer import AudioBuffer
+
+
+logger = logging.getLogger("essay")
+
+
+def _words(text: str) -> list:
+    return text.split()
+
+
+def _norm(word: str) -> str:
+    return re.sub(r"[^\w']", "", word.lower())
+
+
+def _common_prefix(a: list, b: list) -> list:
+    n = 0
+    for x, y in zip(a, b):
+        if _norm(x) != _norm(y):
+            break
+        n += 1
+    return b[:n]
+
+
+class StreamingTranscriber:
+    """Partial transcripts for one utterance while it is still being spoken.
+
+    Every `interval` seconds of new audio, the not-yet-committed tail of the
+    utterance (plus `overlap` seconds before it) is transcribed and sent to
+    `on_partial`. The words two consecutive passes agree on are reported as
+    `stable`. Once the tail is longer than `seal_after`, it is cut at its
+    quietest 30 ms frame and the part before the cut is transcribed one last
+    time and committed. `finalize` therefore only transcribes the audio after
+    the last cut.
+
+    Passes run as background tasks, one at a time, so the websocket receive
+    loop never waits on STT. They are never cancelled, since that would
+    cancel requests already queued in the backend: `finalize` waits for the
+    running pass, and `reset` lets it finish and ignores its result.
+    `audio` is the session's PcmAccumulator.
+    """
+
+    def __init__(self, backend, on_partial, sample_rate=16000, interval=1.5, overlap=0.3,
+                 seal_after=4.0, min_seal=2.0, frame_seconds=0.03):
+        self.backend = backend
+        self.on_partial = on_partial
+        self.sample_rate = sample_rate
+        self.interval = int(interval * sample_rate)
+        self.overlap = int(overlap * sample_rate)
+        self.seal_after = int(seal_after * sample_rate)
+        self.min_seal = int(min_seal * sample_rate)
+        self.frame = int(frame_seconds * sample_rate)
+        self._task = None
+        self._generation = 0
+        self.reset()
+
+    def reset(self):
+        # A pass still running belongs to the previous utterance; it sees the new generation and drops its result.
+        self._generation += 1
+        self._task = None
+        self._finalizing = False
+        self.committed = []
+        self.committed_samples = 0
+        self._previous = []
+        self._last_pass = 0
+
+    def _window(self, audio, start, end) -> AudioBuffer:
+        start = max(start - self.overlap, 0) if start else 0
+        return AudioBuffer(audio.view()[start * 2:end * 2], sample_rate=self.sample_rate,
+                           name=f"partial_{start}_{end}.wav")
+
+    def _seal_point(self, audio, start, end) -> int:
+        """Quietest frame between `min_seal` after `start` and half a second before `end`."""
+        lo = start + self.min_seal
+        hi = end - self.sample_rate // 2
+        frames = (hi - lo) // self.frame
+        if frames <= 0:
+            return end
+        samples = np.frombuffer(audio.view(), dtype=np.int16)[lo:lo + frames * self.frame]
+        energy = np.square(samples.astype(np.float32)).reshape(frames, self.frame).mean(axis=1)
+        return lo + int(np.argmin(energy)) * self.frame + self.frame // 2
+
+    def _dedupe(self, words: list) -> list:
+        """Drop the words the overlap repeats from the end of the committed text."""
+        for k in range(min(len(self.committed), len(words), 8), 0, -1):
+            if [_norm(w) for w in self.committed[-k:]] == [_norm(w) for w in words[:k]]:
+                return words[k:]
+        return words
+
+    async def _transcribe(self, audio, start, end) -> list:
+        words = _words(await self.backend.transcribe(self._window(audio, start, end)))
+        return self._dedupe(words) if start else words
+
+    def update(self, audio):
+        """Start a partial pass if enough new audio arrived and none is running."""
+        if self._task is not None and not self._task.done():
+            return
+        if len(audio) - self._last_pass < self.interval:
+            return
+        self._last_pass = len(audio)
+        self._task = asyncio.create_task(self._pass(audio, len(audio), self._generation))
+
+    async def _pass(self, audio, end, generation):
+        try:
+            with metrics.tracker("stt.partial").time():
+                if end - self.committed_samples >= self.seal_after:
+                    cut = self._seal_point(audio, self.committed_samples, end)
+                    sealed = await self._transcribe(audio, self.committed_samples, cut)
+                    if generation != self._generation:
+                        return
+                    self.committed += sealed
+                    self.committed_samples = cut
+                    self._previous = []
+                tail = await self._transcribe(audio, self.committed_samples, end)
+            if generation != self._generation or self._finalizing:
+                return
+            stable = _common_prefix(self._previous, tail)
+            self._previous = tail
+            await self.on_partial({
+                "text": " ".join(self.committed + tail),
+                "stable": " ".join(self.committed + stable),
+                "final": False,
+            })
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"[STT] Partial transcription failed: {e}")
+
+    async def finalize(self, audio) -> str:
+        """Full transcript of the utterance, transcribing only the uncommitted tail."""
+        self._finalizing = True
+        if self._task is not None:
+            # Its sealed words are kept, its partial is not sent. Shielded so
+            # that cancelling finalize does not cancel the pass with it.
+            await asyncio.shield(self._task)
+        start = time.perf_counter()
+        tail = await self._transcribe(audio, self.committed_samples, len(audio))
+        metrics.tracker("stt.final_tail").observe(time.perf_counter() - start)
+        text = " ".join(self.committed + tail)
+        try:
+            await self.on_partial({"text": text, "stable": text, "final": True})
+        except Exception as e:
+            logger.warning(f"[STT] Could not send final transcript: {e}")
+        return text
@@ -0,0 +1,240 @@
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+import requests
+from dotenv import load_dotenv
+
+import metrics
+from http_client import http_client
+from model_registry import registry, LOCAL_WHISPER_MODEL, LOCAL_WHISPER_INT8
+
+
+logger = logging.getLogger("essay")
+
+load_dotenv()
+
+# "http" (hosted Whisper) or "local" (in-process Whisper on this machine).
+STT_BACKEND = os.getenv("STT_BACKEND", "http")
+
+WHISPER_API_URL = "https://api-inference.huggingface.co/models/openai/whisper-large-v3"
+# Hugging Face access token for the hosted backend; only ever read from the environment.
+HF_TOKEN = os.getenv("HF_TOKEN")
+
+WHISPER_SAMPLE_RATE = 16000
+# Whisper's encoder sees at most 30 s; longer audio is transcribed in pieces.
+WHISPER_WINDOW_SECONDS = 30
+
+
+class SttBackend(ABC):
+    """Speech-to-text engine behind `Topic.speech_to_text`.
+
+    `transcribe` is used from the event loop, `transcribe_sync` from worker
+    processes without one. Both take an AudioBuffer and return the stripped
+    transcript; failures raise and are handled by the caller.
+    """
+
+    name = "base"
+
+    @property
+    @abstractmethod
+    def version(self) -> str:
+        """Identifies the model behind this backend, for result caching."""
+
+    @abstractmethod
+    async def transcribe(self, audio) -> str:
+        ...
+
+    @abstractmethod
+    def transcribe_sync(self, audio) -> str:
+        ...
+
+    def _observe(self, start, audio):
+        elapsed = time.perf_counter() - start
+        metrics.tracker(f"stt.{self.name}").observe(elapsed)
+        if audio.duration > 0:
+            metrics.gauge(f"stt.{self.name}.real_time_factor").set(round(elapsed / audio.duration, 3))
+
+
+class HttpWhisperBackend(SttBackend):
+    """Hosted whisper-large-v3 on the Hugging Face inference API. Needs HF_TOKEN."""
+
+    name = "http"
+
+    def __init__(self, url=WHISPER_API_URL, token=HF_TOKEN, client=http_client, timeout=60):
+        self.url = url
+        self.token = token
+        self.client = client
+        self.timeout = timeout
+        self._sync_http = requests.Session()
+
+    @property
+    def version(self) -> str:
+        return self.url.rsplit("/models/", 1)[-1]
+
+    @property
+    def headers(self) -> dict:
+        # Checked per call rather than at startup, so the app boots without a token.
+        if not self.token:
+            raise RuntimeError(
+                "STT_BACKEND=http needs a Hugging Face access token in HF_TOKEN "
+                "(or use STT_BACKEND=local)"
+            )
+        return {"Authorization": f"Bearer {self.token}", "Content-Type": "audio/wav"}
+
+    async def transcribe(self, audio) -> str:
+        start = time.perf_counter()
+        result = await self.client.post_bytes(self.url, audio.wav, headers=self.headers)
+        self._observe(start, audio)
+        return result.get("text", "").strip()
+
+    def transcribe_sync(self, audio) -> str:
+        start = time.perf_counter()
+        response = self._sync_http.post(self.url, headers=self.headers, data=audio.wav, timeout=self.timeout)
+        response.raise_for_status()
+        self._observe(start, audio)
+        return response.json().get("text", "").strip()
+
+
+class LocalWhisperBackend(SttBackend):
+    """In-process Whisper (int8-quantized on CPU) fed from one shared queue.
+
+    Every utterance is cut into windows of at most 30 s and each window goes
+    through the queue; a worker thread drains it into batches of up to
+    `max_batch` windows, waiting at most `max_wait` seconds to fill one, so
+    concurrent sessions share a padded forward pass instead of queueing
+    behind each other.
+    """
+
+    name = "local"
+
+    def __init__(self, max_batch=8, max_wait=0.05, language="en"):
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.language = language
+        self._queue = queue.Queue()
+        self._worker = None
+        self._start_lock = threading.Lock()
+
+    @property
+    def version(self) -> str:
+        return f"{LOCAL_WHISPER_MODEL}{':int8' if LOCAL_WHISPER_INT8 else ''}"
+
+    def _ensure_worker(self):
+        if self._worker is not None:
+            return
+        with self._start_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="whisper-local", daemon=True)
+                self._worker.start()
+
+    def _windows(self, audio) -> list:
+        samples = audio.to_numpy().mean(axis=0)
+        if audio.sample_rate != WHISPER_SAMPLE_RATE:
+            import torch
+            import torchaudio.functional as AF
+
+            samples = AF.resample(torch.from_numpy(samples), audio.sample_rate, WHISPER_SAMPLE_RATE).numpy()
+        size = WHISPER_WINDOW_SECONDS * WHISPER_SAMPLE_RATE
+        return [samples[i:i + size] for i in range(0, max(len(samples), 1), size)]
+
+    def _submit(self, audio) -> list:
+        self._ensure_worker()
+        futures = []
+        for window in self._windows(audio):
+            future = Future()
+            self._queue.put((window, future))
+            futures.append(future)
+        return futures
+
+    def _run(self):
+        while True:
+            try:
+                batch = [self._queue.get()]
+                deadline = time.monotonic() + self.max_wait
+                while len(batch) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(self._queue.get(timeout=remaining))
+                    except queue.Empty:
+                        break
+                # Drop windows whose caller has given up; the rest can no longer be cancelled.
+                batch = [item for item in batch if item[1].set_running_or_notify_cancel()]
+                if batch:
+                    self._transcribe_batch(batch)
+            except Exception as e:
+                # The worker is started once, so it must outlive any single batch.
+                logger.error(f"[STT] Local worker error: {e}")
+
+    def _transcribe_batch(self, batch):
+        try:
+            import torch
+
+            processor, model, device = registry.get("whisper_local")
+            with metrics.tracker("stt.local.batch").time():
+                features = processor(
+                    [window.astype(np.float32, copy=False) for window, _ in batch],
+                    sampling_rate=WHISPER_SAMPLE_RATE,
+                    return_tensors="pt",
+                ).input_features.to(device)
+                generate_kwargs = {}
+                if getattr(model.generation_config, "is_multilingual", False):
+                    generate_kwargs = {"language": self.language, "task": "transcribe"}
+                with torch.no_grad():
+                    tokens = model.generate(features, **generate_kwargs)
+                texts = processor.batch_decode(tokens, skip_special_tokens=True)
+            metrics.gauge("stt.local.batch_size").set(len(batch))
+            metrics.counter("stt.local.windows").inc(len(batch))
+            for (_, future), text in zip(batch, texts):
+                future.set_result(text.strip())
+        except Exception as e:
+            logger.error(f"[STT] Local batch of {len(batch)} failed: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+    async def transcribe(self, audio) -> str:
+        start = time.perf_counter()
+        texts = await asyncio.gather(*(asyncio.wrap_future(f) for f in self._submit(audio)))
+        self._observe(start, audio)
+        return " ".join(text for text in texts if text)
+
+    def transcribe_sync(self, audio) -> str:
+        start = time.perf_counter()
+        texts = [future.result() for future in self._submit(audio)]
+        self._observe(start, audio)
+        return " ".join(text for text in texts if text)
+
+
+BACKENDS = {
+    "http": HttpWhisperBackend,
+    "local": LocalWhisperBackend,
+}
+
+
+def create_backend(name: str) -> SttBackend:
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown STT_BACKEND '{name}', expected one of {sorted(BACKENDS)}")
+    return BACKENDS[name]()
+
+
+_stt_backend = None
+_stt_backend_lock = threading.Lock()
+
+
+def get_stt_backend() -> SttBackend:
+    """The STT_BACKEND-selected backend, created on first use."""
+    global _stt_backend
+    if _stt_backend is None:
+        with _stt_backend_lock:
+            if _stt_backend is None:
+                _stt_backend = create_backend(STT_BACKEND)
+    return _stt_backend
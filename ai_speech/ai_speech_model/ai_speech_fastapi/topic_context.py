@@ -0,0 +1,205 @@
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+from collections import Counter
+
+import lxml.html
+
+import metrics
+from http_client import http_client
+from ttl_cache import TTLCache
+
+
+logger = logging.getLogger("essay")
+
+SCRAPING_API_URL = "https://api.scrapingdog.com/scrape"
+
+_DROP_TAGS = ("script", "style", "noscript", "table", "sup", "figure", "math")
+_DROP_CLASSES = ("reference", "reflist", "navbox", "infobox", "hatnote", "mw-editsection", "metadata", "thumb", "printfooter")
+_CITATION = re.compile(r"\[(?:\d+|[a-z]|citation needed|note \d+)\]")
+_WORD = re.compile(r"[a-z0-9']+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were which with".split()
+)
+
+
+def normalize_topic(topic: str) -> str:
+    return " ".join(topic.replace("_", " ").lower().split())
+
+
+def extract_paragraphs(html: str, min_chars=60) -> list:
+    """Body paragraphs of a Wikipedia article, without navigation, tables or citation marks."""
+    if not html or not html.strip():
+        return []
+    root = lxml.html.fromstring(html)
+    content = root.xpath("//div[@id='mw-content-text']") or root.xpath("//body") or [root]
+    content = content[0]
+
+    for element in content.xpath(" | ".join(f".//{tag}" for tag in _DROP_TAGS)):
+        element.drop_tree()
+    class_test = " or ".join(f"contains(concat(' ', normalize-space(@class), ' '), ' {c} ')" for c in _DROP_CLASSES)
+    for element in content.xpath(f".//*[{class_test}]"):
+        element.drop_tree()
+
+    paragraphs = []
+    for p in content.iter("p"):
+        text = _CITATION.sub("", " ".join(p.text_content().split()))
+        if len(text) >= min_chars:
+            paragraphs.append(text)
+    return paragraphs
+
+
+def _terms(text: str) -> list:
+    return [w for w in _WORD.findall(text.lower()) if w not in _STOPWORDS]
+
+
+def condense(paragraphs: list, query: str, top_k=5, max_words=600) -> str:
+    """The lead paragraph plus the `top_k` paragraphs most relevant to `query`, in page order.
+
+    Relevance is query-term frequency over paragraph length (so long
+    paragraphs do not win by size alone). The result is capped at
+    `max_words` so the prompt stays bounded whatever the page length.
+    """
+    if not paragraphs:
+        return ""
+    query_terms = set(_terms(query))
+    scores = []
+    for index, paragraph in enumerate(paragraphs[1:], start=1):
+        terms = _terms(paragraph)
+        counts = Counter(terms)
+        hits = sum(counts[t] for t in query_terms)
+        scores.append((hits / (len(terms) ** 0.5 or 1), -index, index))
+
+    chosen = [0] + sorted(index for _, _, index in sorted(scores, reverse=True)[:top_k])
+    words = []
+    for index in chosen:
+        remaining = max_words - len(words)
+        if remaining <= 0:
+            break
+        words.extend(paragraphs[index].split()[:remaining])
+    return " ".join(words)
+
+
+class TopicContextService:
+    """Condensed Wikipedia context for a topic, cached across requests and restarts.
+
+    Extracted paragraphs are cached under the normalized topic, in-process
+    and in Redis (once `configure` is called); the page itself is fetched
+    under the title as the caller wrote it, since Wikipedia titles are
+    case-sensitive after the first letter. A page with no usable paragraphs
+    is only remembered for `empty_ttl`, so a bad fetch is retried soon. An entry younger than
+    `fresh_ttl` is served as is. An older one, up to `stale_ttl`, is still
+    served, but a refresh starts in the background (stale-while-revalidate).
+    Only a miss waits on ScrapingDog, and concurrent misses for one topic
+    share a single fetch.
+    """
+
+    def __init__(self, client=http_client, api_key=None, prefix="topic_context",
+                 fresh_ttl=24 * 3600, stale_ttl=14 * 24 * 3600, empty_ttl=300, top_k=5, max_words=600):
+        self.client = client
+        self.api_key = api_key
+        self.prefix = prefix
+        self.fresh_ttl = fresh_ttl
+        self.stale_ttl = stale_ttl
+        self.empty_ttl = empty_ttl
+        self.top_k = top_k
+        self.max_words = max_words
+        self.local = TTLCache(maxsize=256, ttl=stale_ttl)
+        self.redis = None
+        self._inflight = {}
+
+    def configure(self, redis_client, api_key=None):
+        self.redis = redis_client
+        if api_key:
+            self.api_key = api_key
+
+    def _key(self, topic):
+        return f"{self.prefix}:{topic}"
+
+    def _load(self, key):
+        entry = self.local.get(key)
+        if entry is not None or self.redis is None:
+            return entry
+        try:
+            raw = self.redis.get(key)
+        except Exception as e:
+            logger.warning(f"[TopicContext] Redis read failed for {key}: {e}")
+            return None
+        if raw is None:
+            return None
+        entry = json.loads(raw)
+        self.local.set(key, entry)
+        return entry
+
+    def _save(self, key, entry):
+        ttl = self.stale_ttl if entry["paragraphs"] else self.empty_ttl
+        self.local.set(key, entry, ttl=ttl)
+        if self.redis is None:
+            return
+        try:
+            self.redis.setex(key, ttl, json.dumps(entry))
+        except Exception as e:
+            logger.warning(f"[TopicContext] Redis write failed for {key}: {e}")
+
+    async def _fetch(self, key, title) -> dict:
+        url = f"https://en.wikipedia.org/wiki/{'_'.join(title.split())}"
+        api_endpoint = f"{SCRAPING_API_URL}?api_key={self.api_key}&url={url}"
+        with metrics.tracker("topic_context.fetch").time():
+            status_code, html = await self.client.get_text(api_endpoint)
+        if status_code != 200:
+            raise RuntimeError(f"scrape of {url} returned {status_code}")
+        with metrics.tracker("topic_context.extract").time():
+            paragraphs = await asyncio.to_thread(extract_paragraphs, html)
+        entry = {"paragraphs": paragraphs, "fetched_at": time.time()}
+        await asyncio.to_thread(self._save, self._key(key), entry)
+        return entry
+
+    def _fetch_once(self, key, title) -> asyncio.Task:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._fetch(key, title))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return task
+
+    def _refresh_in_background(self, key, title):
+        def log_failure(task):
+            if not task.cancelled() and task.exception() is not None:
+                logger.warning(f"[TopicContext] Refresh of '{title}' failed: {task.exception()}")
+
+        self._fetch_once(key, title).add_done_callback(log_failure)
+
+    async def paragraphs(self, topic: str) -> list:
+        key = normalize_topic(topic)
+        entry = await asyncio.to_thread(self._load, self._key(key))
+        if entry is not None:
+            age = time.time() - entry["fetched_at"]
+            if age > self.fresh_ttl:
+                metrics.counter("topic_context.stale").inc()
+                self._refresh_in_background(key, topic)
+            else:
+                metrics.counter("topic_context.hit").inc()
+            return entry["paragraphs"]
+
+        metrics.counter("topic_context.miss").inc()
+        try:
+            entry = await asyncio.shield(self._fetch_once(key, topic))
+        except Exception as e:
+            logger.exception(f"[TopicContext] Failed to scrape '{topic}': {e}")
+            return []
+        return entry["paragraphs"]
+
+    async def get(self, topic: str, query: str = None) -> str:
+        """Condensed context for `topic`, ranked against `query` (defaults to the topic)."""
+        paragraphs = await self.paragraphs(topic)
+        return condense(paragraphs, query or topic, top_k=self.top_k, max_words=self.max_words)
+
+
+topic_context = TopicContextService(
+    fresh_ttl=int(os.getenv("TOPIC_CONTEXT_TTL", 24 * 3600)),
+    top_k=int(os.getenv("TOPIC_CONTEXT_TOP_K", 5)),
+    max_words=int(os.getenv("TOPIC_CONTEXT_MAX_WORDS", 600)),
+)
@@ -0,0 +1,147 @@
+import io
+import logging
+import os
+import re
+import time
+
+import numpy as np
+import soundfile as sf
+
+import metrics
+from model_registry import registry
+
+
+logger = logging.getLogger("essay")
+
+SAMPLE_RATE = 24000
+DEFAULT_VOICE = "af_heart"
+
+
+def encode_wav(samples: np.ndarray, sample_rate=SAMPLE_RATE) -> bytes:
+    """16-bit PCM WAV bytes for a float32 buffer, encoded in memory."""
+    buffer = io.BytesIO()
+    sf.write(buffer, samples, sample_rate, format="WAV", subtype="PCM_16")
+    return buffer.getvalue()
+
+
+def encode_pcm16(samples: np.ndarray) -> bytes:
+    """Raw little-endian int16 PCM, for streaming frames with no container."""
+    return (np.clip(samples, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+
+
+def write_atomic(path: str, data: bytes):
+    """Write then rename, so pollers never see a half-written file."""
+    tmp_path = f"{path}.part"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class TtsEngine:
+    """Synthesizes with the registry's warm Kokoro pipeline into one contiguous buffer.
+
+    Generator segments are copied into a single preallocated float32 array
+    (grown geometrically if the estimate is short), so a reply costs one
+    copy per segment and one WAV encode instead of a temp file and a
+    re-parse per segment.
+    """
+
+    def __init__(self, default_voice=DEFAULT_VOICE, sample_rate=SAMPLE_RATE):
+        self.default_voice = default_voice
+        self.sample_rate = sample_rate
+        self._warm_voices = set()
+
+    def _pipeline(self, voice):
+        pipeline = registry.get("kokoro")
+        if voice not in self._warm_voices and hasattr(pipeline, "load_voice"):
+            with registry.lock("kokoro"):
+                pipeline.load_voice(voice)
+            self._warm_voices.add(voice)
+        return pipeline
+
+    def segments(self, text: str, voice=None):
+        """Yield float32 segments as Kokoro produces them.
+
+        The pipeline lock is held only while one segment is generated, so a
+        long essay job and a live reply take turns segment by segment, and
+        a slow consumer never holds it.
+        """
+        voice = voice or self.default_voice
+        pipeline = self._pipeline(voice)
+        generator = pipeline(text, voice=voice)
+        while True:
+            with registry.lock("kokoro"):
+                result = next(generator, None)
+            if result is None:
+                return
+            _, _, audio = result
+            if audio is None:
+                continue
+            audio = audio.numpy() if hasattr(audio, "numpy") else np.asarray(audio)
+            yield audio.astype(np.float32, copy=False)
+
+    def synthesize(self, text: str, voice=None) -> np.ndarray:
+        start = time.perf_counter()
+        # Roughly 12 characters of English per second of speech.
+        capacity = max(self.sample_rate, int(len(text) / 12 * self.sample_rate))
+        buffer = np.empty(capacity, dtype=np.float32)
+        length = 0
+
+        for segment in self.segments(text, voice):
+            needed = length + len(segment)
+            if needed > len(buffer):
+                grown = np.empty(max(len(buffer) * 2, needed), dtype=np.float32)
+                grown[:length] = buffer[:length]
+                buffer = grown
+            buffer[length:needed] = segment
+            length = needed
+
+        elapsed = time.perf_counter() - start
+        audio_seconds = length / self.sample_rate
+        metrics.tracker("tts.synthesize").observe(elapsed)
+        if audio_seconds > 0:
+            metrics.gauge("tts.real_time_factor").set(round(elapsed / audio_seconds, 3))
+        return buffer[:length]
+
+    def synthesize_wav(self, text: str, voice=None) -> bytes:
+        return encode_wav(self.synthesize(text, voice), self.sample_rate)
+
+    def silence_wav(self, seconds=1.0) -> bytes:
+        return encode_wav(np.zeros(int(seconds * self.sample_rate), dtype=np.float32), self.sample_rate)
+
+
+class SentenceSplitter:
+    """Cuts a token stream into sentences as soon as each one is complete.
+
+    Fragments shorter than `min_chars` are held back and merged with the next
+    sentence so "Hi!" does not become its own synthesis call.
+    """
+
+    _boundary = re.compile(r'(?<=[.?!])\s+')
+
+    def __init__(self, min_chars=20):
+        self.min_chars = min_chars
+        self._pending = ""
+
+    def feed(self, token: str) -> list:
+        self._pending += token
+        parts = self._boundary.split(self._pending)
+        # The last part has no boundary after it yet.
+        self._pending = parts.pop()
+        sentences = []
+        carry = ""
+        for part in parts:
+            carry = f"{carry} {part}".strip()
+            if len(carry) >= self.min_chars:
+                sentences.append(carry)
+                carry = ""
+        if carry:
+            self._pending = f"{carry} {self._pending}" if self._pending else carry
+        return sentences
+
+    def flush(self) -> str:
+        tail, self._pending = self._pending.strip(), ""
+        return tail
+
+
+tts_engine = TtsEngine()
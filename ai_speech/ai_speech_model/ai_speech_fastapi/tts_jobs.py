@@ -0,0 +1,176 @@
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+
+import metrics
+from ttl_cache import TTLCache
+
+
+logger = logging.getLogger("essay")
+
+TERMINAL = ("done", "failed")
+
+
+class TtsQueueFull(Exception):
+    pass
+
+
+class TtsJobQueue:
+    """Background text-to-speech jobs with status kept in Redis.
+
+    `submit` stores a "queued" record and returns the job id at once. A fixed
+    pool of `workers` tasks runs the synthesis (`synthesize(text, username,
+    job_id)` in a thread, returning the output path) and moves the record to
+    "running", then "done" with the path or "failed" with the error. At most
+    `max_pending` jobs may wait; beyond that `submit` raises TtsQueueFull.
+    Records expire after `ttl` seconds. The latest job per user is indexed,
+    so clients that only know their username can still find their audio;
+    the output file is the user's own and each job overwrites it.
+    """
+
+    def __init__(self, synthesize, workers=2, max_pending=64, ttl=3600, prefix="tts_job"):
+        self.synthesize = synthesize
+        self.workers = workers
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self.prefix = prefix
+        self.redis = None
+        self.local = TTLCache(maxsize=4096, ttl=ttl)
+        self._queue = None
+        self._tasks = []
+        self._events = {}
+
+    def configure(self, redis_client):
+        self.redis = redis_client
+
+    async def start(self):
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_pending)
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        logger.info(f"[TTS jobs] {self.workers} workers started")
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def _key(self, job_id):
+        return f"{self.prefix}:{job_id}"
+
+    def _latest_key(self, username):
+        return f"{self.prefix}:latest:{username}"
+
+    def _write(self, job):
+        self.local.set(job["id"], job)
+        if self.redis is None:
+            return
+        try:
+            pipe = self.redis.pipeline()
+            pipe.setex(self._key(job["id"]), self.ttl, json.dumps(job))
+            if job["status"] == "queued":
+                pipe.setex(self._latest_key(job["username"]), self.ttl, job["id"])
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"[TTS jobs] Could not store job {job['id']}: {e}")
+
+    def _read(self, job_id):
+        job = self.local.get(job_id)
+        if job is not None or self.redis is None:
+            return job
+        try:
+            raw = self.redis.get(self._key(job_id))
+        except Exception as e:
+            logger.warning(f"[TTS jobs] Could not read job {job_id}: {e}")
+            return None
+        return json.loads(raw) if raw else None
+
+    def _read_latest(self, username):
+        if self.redis is not None:
+            try:
+                return self.redis.get(self._latest_key(username))
+            except Exception as e:
+                logger.warning(f"[TTS jobs] Could not read latest job for {username}: {e}")
+        return self.local.get(self._latest_key(username))
+
+    async def _update(self, job, **fields):
+        job.update(fields, updated_at=time.time())
+        await asyncio.to_thread(self._write, job)
+
+    async def submit(self, text: str, username: str) -> str:
+        if self._queue is None:
+            await self.start()
+        if self._queue.full():
+            metrics.counter("tts_jobs.rejected").inc()
+            raise TtsQueueFull(f"{self.max_pending} TTS jobs already pending")
+        job = {"id": uuid.uuid4().hex, "username": username, "status": "queued", "created_at": time.time()}
+        self.local.set(self._latest_key(username), job["id"])
+        self._events[job["id"]] = asyncio.Event()
+        await self._update(job)
+        self._queue.put_nowait((job, text))
+        metrics.gauge("tts_jobs.pending").set(self._queue.qsize())
+        return job["id"]
+
+    async def _worker(self, index):
+        while True:
+            job, text = await self._queue.get()
+            metrics.gauge("tts_jobs.pending").set(self._queue.qsize())
+            metrics.tracker("tts_jobs.queue_wait").observe(time.time() - job["created_at"])
+            try:
+                await self._update(job, status="running")
+                with metrics.tracker("tts_jobs.run").time():
+                    path = await asyncio.to_thread(self.synthesize, text, job["username"], job["id"])
+                await self._update(job, status="done", path=path)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[TTS jobs] Job {job['id']} failed: {e}")
+                metrics.counter("tts_jobs.failed").inc()
+                await self._update(job, status="failed", error=str(e) or type(e).__name__)
+            finally:
+                event = self._events.pop(job["id"], None)
+                if event is not None:
+                    event.set()
+                self._queue.task_done()
+
+    async def get(self, job_id: str):
+        return await asyncio.to_thread(self._read, job_id)
+
+    async def latest(self, username: str):
+        return await asyncio.to_thread(self._read_latest, username)
+
+    async def wait(self, job_id: str, timeout: float):
+        """The job once it finishes, or its current state after `timeout` seconds."""
+        deadline = time.monotonic() + timeout
+        while True:
+            job = await self.get(job_id)
+            remaining = deadline - time.monotonic()
+            if job is None or job["status"] in TERMINAL or remaining <= 0:
+                return job
+            event = self._events.get(job_id)
+            if event is not None:
+                try:
+                    await asyncio.wait_for(event.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+            else:
+                # Submitted by another process: fall back to polling the store.
+                await asyncio.sleep(min(0.5, remaining))
+
+
+def _synthesize_to_file(text, username, job_id):
+    from ai_speech_module import Topic
+
+    # One file per user, overwritten (atomically) by their next essay, so nothing accumulates on disk.
+    return Topic()._text_to_speech_sync(text, username)
+
+
+tts_jobs = TtsJobQueue(
+    _synthesize_to_file,
+    workers=int(os.getenv("TTS_JOB_WORKERS", 2)),
+    max_pending=int(os.getenv("TTS_JOB_MAX_PENDING", 64)),
+)
@@ -0,0 +1,271 @@
+import logging
+import threading
+
+import numpy as np
+import torch
+import torchaudio
+
+
+logger = logging.getLogger("essay")
+
+# Recurrent state attributes of the Silero TorchScript module (v5, then v4 names).
+_STATE_ATTRS = ("_state", "_context", "_last_sr", "_last_batch_size", "_h", "_c")
+
+
+class SileroVadEngine:
+    """Batched Silero VAD: frames the whole waveform once and scores it in a few forward calls."""
+
+    def __init__(self, model, sample_rate=16000, window_size=512, hop_size=160, threshold=0.3, batch_size=1024):
+        self.model = model
+        self.sample_rate = sample_rate
+        self.window_size = window_size
+        self.hop_size = hop_size
+        self.threshold = threshold
+        self.batch_size = batch_size
+        # The TorchScript model keeps recurrent state on the module itself,
+        # so concurrent callers must not interleave forward calls.
+        self._lock = threading.Lock()
+        self._resamplers = {}
+
+    def _resampler(self, orig_sr):
+        resampler = self._resamplers.get(orig_sr)
+        if resampler is None:
+            resampler = torchaudio.transforms.Resample(orig_freq=orig_sr, new_freq=self.sample_rate)
+            self._resamplers[orig_sr] = resampler
+        return resampler
+
+    def prepare(self, wav: torch.Tensor, sr: int):
+        """Downmix, resample and peak-normalize; returns a 1-D tensor or None for digital silence."""
+        if wav.dim() > 1 and wav.shape[0] > 1:
+            wav = torch.mean(wav, dim=0, keepdim=True)
+
+        if sr != self.sample_rate:
+            wav = self._resampler(sr)(wav)
+
+        wav = wav.reshape(-1)
+        max_abs = wav.abs().max() if wav.numel() else torch.tensor(0.0)
+        if max_abs <= 0:
+            return None
+        return wav / max_abs
+
+    def frame(self, wav: torch.Tensor) -> torch.Tensor:
+        """Strided (num_windows, window_size) view over the waveform, no copy."""
+        return wav.unfold(0, self.window_size, self.hop_size)
+
+    def _reset_states(self):
+        if hasattr(self.model, "reset_states"):
+            self.model.reset_states()
+
+    def _save_state(self) -> dict:
+        state = {}
+        for name in _STATE_ATTRS:
+            if hasattr(self.model, name):
+                value = getattr(self.model, name)
+                state[name] = value.clone() if isinstance(value, torch.Tensor) else value
+        return state
+
+    def _load_state(self, state: dict):
+        for name, value in state.items():
+            setattr(self.model, name, value)
+
+    def stream(self, windows: torch.Tensor, state):
+        """Score consecutive windows in order, carrying a caller-owned recurrent state.
+
+        The shared model only ever holds a session's state for the duration of
+        one call, so many sessions can stream through a single instance.
+        """
+        probs = []
+        with self._lock, torch.no_grad():
+            if state is None:
+                self._reset_states()
+            else:
+                self._load_state(state)
+            for window in windows:
+                try:
+                    probs.append(self.model(window.unsqueeze(0), self.sample_rate).item())
+                except Exception as e:
+                    logger.warning(f"[VAD] Skipping streamed window due to error: {e}")
+                    probs.append(0.0)
+            state = self._save_state()
+        return probs, state
+
+    def session(self, **kwargs):
+        return StreamingVadSession(self, **kwargs)
+
+    def score(self, wav: torch.Tensor) -> torch.Tensor:
+        """Speech probability for every window, scored in batches of `batch_size`."""
+        frames = self.frame(wav)
+        probs = []
+        with self._lock, torch.no_grad():
+            for start in range(0, frames.shape[0], self.batch_size):
+                batch = frames[start:start + self.batch_size].contiguous()
+                # Rows of consecutive batches are unrelated windows, so state must not carry over.
+                self._reset_states()
+                try:
+                    probs.append(self.model(batch, self.sample_rate).reshape(-1).float())
+                except Exception as e:
+                    logger.warning(f"[VAD] Skipping {batch.shape[0]} windows due to error: {e}")
+                    probs.append(torch.zeros(batch.shape[0]))
+            self._reset_states()
+        return torch.cat(probs) if probs else torch.zeros(0)
+
+    def segments(self, probs: torch.Tensor) -> list:
+        """Collapse per-window decisions into contiguous speech segments (seconds)."""
+        speech = (probs > self.threshold).to(torch.int8)
+        if not speech.any():
+            return []
+        edges = torch.diff(torch.cat([torch.zeros(1, dtype=torch.int8), speech, torch.zeros(1, dtype=torch.int8)]))
+        starts = torch.nonzero(edges == 1).squeeze(1).tolist()
+        ends = torch.nonzero(edges == -1).squeeze(1).tolist()
+        return [
+            {
+                "start": round(s * self.hop_size / self.sample_rate, 3),
+                "end": round(((e - 1) * self.hop_size + self.window_size) / self.sample_rate, 3),
+            }
+            for s, e in zip(starts, ends)
+        ]
+
+    def analyse(self, wav: torch.Tensor, sr: int) -> dict:
+        """Same contract as Topic.silvero_vad: longest gap between speech windows, plus segments."""
+        wav = self.prepare(wav, sr)
+        if wav is None:
+            return {"duration": 0.0, "segments": []}
+
+        total = float(len(wav) / self.sample_rate)
+        if len(wav) < self.window_size:
+            return {"duration": total, "segments": []}
+
+        probs = self.score(wav)
+        speech_idx = torch.nonzero(probs > self.threshold).squeeze(1)
+
+        if speech_idx.numel() == 0:
+            return {"duration": total, "segments": []}
+
+        if speech_idx.numel() > 1:
+            max_silence = float(torch.diff(speech_idx).max().item() * self.hop_size / self.sample_rate)
+        else:
+            max_silence = 0.0
+
+        return {"duration": max_silence, "segments": self.segments(probs)}
+
+
+class StreamingVadSession:
+    """Per-connection VAD fed with raw int16 PCM frames straight from the websocket.
+
+    Frames are scored in native 512-sample windows with the model's recurrent
+    state kept between frames; samples that do not fill a window wait in a
+    small ring buffer for the next frame. `feed` returns speech_start and
+    speech_end events as soon as they are detected, and speech_discarded for
+    runs shorter than `min_speech`, after which the session is idle again.
+    """
+
+    def __init__(self, engine, threshold=None, neg_threshold=None, min_silence=2.0, min_speech=0.25):
+        self.engine = engine
+        self.window_size = engine.window_size
+        self.sample_rate = engine.sample_rate
+        self.threshold = engine.threshold if threshold is None else threshold
+        self.neg_threshold = max(self.threshold - 0.15, 0.01) if neg_threshold is None else neg_threshold
+        self.min_silence = min_silence
+        self.min_speech = min_speech
+
+        self._state = None
+        self._ring = torch.zeros(self.window_size)
+        self._ring_fill = 0
+        self._odd_byte = b""
+
+        self.samples_seen = 0
+        self._origin = 0.0
+        self.triggered = False
+        self.speech_start = None
+        self.last_speech = None
+
+    @property
+    def silence_duration(self) -> float:
+        """Seconds since the last window scored as speech (or since the last reset)."""
+        now = self.samples_seen / self.sample_rate
+        return now - (self.last_speech if self.last_speech is not None else self._origin)
+
+    @property
+    def speech_duration(self) -> float:
+        """Length of the speech run in progress, 0 when not in speech."""
+        if not self.triggered:
+            return 0.0
+        return self.last_speech - self.speech_start
+
+    def reset(self):
+        """Forget the current utterance but keep the recurrent state and clock."""
+        self._origin = self.samples_seen / self.sample_rate
+        self.triggered = False
+        self.speech_start = None
+        self.last_speech = None
+
+    def _windows(self, pcm: bytes) -> torch.Tensor:
+        data = self._odd_byte + pcm
+        if len(data) % 2:
+            self._odd_byte, data = data[-1:], data[:-1]
+        else:
+            self._odd_byte = b""
+        samples = torch.from_numpy(np.frombuffer(data, dtype=np.int16).astype(np.float32) / 32768.0)
+
+        windows = []
+        if self._ring_fill:
+            take = min(self.window_size - self._ring_fill, len(samples))
+            self._ring[self._ring_fill:self._ring_fill + take] = samples[:take]
+            self._ring_fill += take
+            samples = samples[take:]
+            if self._ring_fill < self.window_size:
+                return torch.zeros(0, self.window_size)
+            windows.append(self._ring.clone().unsqueeze(0))
+            self._ring_fill = 0
+
+        full = len(samples) // self.window_size
+        if full:
+            windows.append(samples[:full * self.window_size].view(full, self.window_size))
+        rest = samples[full * self.window_size:]
+        if len(rest):
+            self._ring[:len(rest)] = rest
+            self._ring_fill = len(rest)
+
+        if not windows:
+            return torch.zeros(0, self.window_size)
+        return torch.cat(windows) if len(windows) > 1 else windows[0]
+
+    def feed(self, pcm: bytes) -> list:
+        """Consume one frame of 16 kHz mono int16 PCM; returns the events it produced."""
+        windows = self._windows(pcm)
+        if not len(windows):
+            return []
+
+        probs, self._state = self.engine.stream(windows, self._state)
+
+        events = []
+        for prob in probs:
+            self.samples_seen += self.window_size
+            now = self.samples_seen / self.sample_rate
+
+            if prob >= self.threshold:
+                self.last_speech = now
+                if not self.triggered:
+                    self.triggered = True
+                    self.speech_start = now - self.window_size / self.sample_rate
+                    events.append({"event": "speech_start", "time": round(self.speech_start, 3)})
+            elif self.triggered and prob < self.neg_threshold:
+                if now - self.last_speech >= self.min_silence:
+                    self.triggered = False
+                    if self.last_speech - self.speech_start >= self.min_speech:
+                        events.append({
+                            "event": "speech_end",
+                            "start": round(self.speech_start, 3),
+                            "time": round(self.last_speech, 3),
+                        })
+                    else:
+                        # Too short to be speech (a click, a cough): forget it as if it never started
+                        events.append({
+                            "event": "speech_discarded",
+                            "start": round(self.speech_start, 3),
+                            "time": round(self.last_speech, 3),
+                        })
+                        self._origin = self.last_speech
+                        self.speech_start = None
+                        self.last_speech = None
+        return events
@@ -166,8 +166,8 @@ const PracticePage = () => {
     const protocol = window.location.protocol === "https:" ? "wss:" : "ws:";
 
     const params = new URLSearchParams({
-      username: encodeURIComponent(username),
-      token: encodeURIComponent(token),
+      username,
+      token,
     });
     if (essayId) {
       params.append("essay_id", essayId);
@@ -315,8 +315,8 @@ const PracticePage = () => {
 
       const protocol = window.location.protocol === "https:" ? "wss:" : "wss:";
       const params = new URLSearchParams({
-        username: encodeURIComponent(username),
-        token: encodeURIComponent(token),
+        username,
+        token,
       });
       if (essayId) {
         params.append("essay_id", essayId);